@@ -674,9 +674,7 @@ class Experiment(mongoengine.Document):
         bool
             True if exists, else False
         """
-        if sample_id not in list(self.list_samples()):
-            return False
-        return True
+        return sample_id in self.list_samples()
 
     def get_sample(self,
                    sample_id: str) -> FileGroup:
@@ -53,6 +53,27 @@ __maintainer__ = "Ross Burton"
 __email__ = "burtonrj@cardiff.ac.uk"
 __status__ = "Production"
 
+# Storage options for index datasets; chunked so they can be partially read, byte-shuffled
+# and LZF compressed since sorted integer indexes compress well at little CPU cost
+INDEX_DATASET_OPTIONS = dict(chunks=True, compression="lzf", shuffle=True)
+
+
+def hdf5_filepath(data_directory: str,
+                  file_id) -> str:
+    """
+    Path of the HDF5 file storing the data of the FileGroup with the given ID.
+
+    Parameters
+    ----------
+    data_directory: str
+    file_id: ObjectId
+
+    Returns
+    -------
+    str
+    """
+    return os.path.join(data_directory, f"{file_id}.hdf5")
+
 
 def _column_names(df: pd.DataFrame,
                   channels: list,
@@ -74,12 +95,32 @@ def _column_names(df: pd.DataFrame,
     -------
     Pandas.DataFrame
     """
+    df.columns = _column_name_list(channels=channels, markers=markers, preference=preference)
+    return df
+
+
+def _column_name_list(channels: list,
+                      markers: list,
+                      preference: str = "markers") -> list:
+    """
+    Given lists of channels and markers, generate the column names according to the
+    given preference; falls back to the other if the preferred name is empty.
+
+    Parameters
+    ----------
+    channels: list
+    markers: list
+    preference: str
+        Valid values are: 'markers' or 'channels'
+
+    Returns
+    -------
+    list
+    """
     mappings = [{"channels": c, "markers": m} for c, m in zip(channels, markers)]
     assert preference in ["markers", "channels"], "preference should be either 'markers' or 'channels'"
     other = [x for x in ["markers", "channels"] if x != preference][0]
-    col_names = list(map(lambda x: x[preference] if x[preference] else x[other], mappings))
-    df.columns = col_names
-    return df
+    return list(map(lambda x: x[preference] if x[preference] else x[other], mappings))
 
 
 class FileGroup(mongoengine.Document):
@@ -135,11 +176,11 @@ class FileGroup(mongoengine.Document):
             assert channels is not None, "Must provide channels to create new FileGroup"
             assert markers is not None, "Must provide markers to create new FileGroup"
             self.save()
-            self.h5path = os.path.join(self.data_directory, f"{self.id.__str__()}.hdf5")
+            self.h5path = hdf5_filepath(self.data_directory, self.id)
             self._init_new_file(data=data, channels=channels, markers=markers)
         else:
             assert self.id is not None, "FileGroup has not been previously defined. Please provide primary data."
-            self.h5path = os.path.join(self.data_directory, f"{self.id.__str__()}.hdf5")
+            self.h5path = hdf5_filepath(self.data_directory, self.id)
             try:
                 self._load_populations()
                 self.tree = construct_tree(populations=self.populations)
@@ -149,7 +190,8 @@ class FileGroup(mongoengine.Document):
 
     def data(self,
              source: str,
-             sample_size: int or float or None = None) -> pd.DataFrame:
+             sample_size: int or float or None = None,
+             columns: list or None = None) -> pd.DataFrame:
         """
         Load the FileGroup dataframe for the desired source file.
 
@@ -159,6 +201,8 @@ class FileGroup(mongoengine.Document):
             Name of the file to load from e.g. either "primary" or the name of a control
         sample_size: int or float (optional)
             Sample the DataFrame
+        columns: list (optional)
+            If given, only these columns are read from disk
         Returns
         -------
         Pandas.DataFrame
@@ -167,10 +211,21 @@ class FileGroup(mongoengine.Document):
             assert source in f.keys(), f"Invalid source, expected one of: {f.keys()}"
             channels = [x.decode("utf-8") for x in f[f"mappings/{source}/channels"][:]]
             markers = [x.decode("utf-8") for x in f[f"mappings/{source}/markers"][:]]
-            data = _column_names(df=pd.DataFrame(f[source][:]),
-                                 channels=channels,
-                                 markers=markers,
-                                 preference=self.columns_default)
+            if columns is None:
+                data = _column_names(df=pd.DataFrame(f[source][:]),
+                                     channels=channels,
+                                     markers=markers,
+                                     preference=self.columns_default)
+            else:
+                col_names = _column_name_list(channels=channels,
+                                              markers=markers,
+                                              preference=self.columns_default)
+                missing = [c for c in columns if c not in col_names]
+                assert not missing, f"Invalid columns {missing}, expected one of: {col_names}"
+                # h5py requires column selections in increasing order
+                positions = sorted(set([col_names.index(c) for c in columns]))
+                data = pd.DataFrame(f[source][:, positions],
+                                    columns=[col_names[i] for i in positions])[columns]
         if sample_size is not None:
             return uniform_downsampling(data=data,
                                         sample_size=sample_size)
@@ -419,7 +474,8 @@ class FileGroup(mongoengine.Document):
     def load_population_df(self,
                            population: str,
                            transform: str or dict or None = "logicle",
-                           label_downstream_affiliations: bool = False) -> pd.DataFrame:
+                           label_downstream_affiliations: bool = False,
+                           columns: list or None = None) -> pd.DataFrame:
         """
         Load the DataFrame for the events pertaining to a single population.
 
@@ -439,6 +495,8 @@ class FileGroup(mongoengine.Document):
             like: "CD4+ -> CD4+CD25+ -> CD4+CD25+CD45RA+" then the population label column
             will contain the name of the lowest possible "leaf" population that an event is
             assigned too.
+        columns: list (optional)
+            If given, only these columns are loaded
 
         Returns
         -------
@@ -446,8 +504,10 @@ class FileGroup(mongoengine.Document):
         """
         assert population in self.tree.keys(), f"Invalid population, {population} does not exist"
         idx = self.get_population(population_name=population).index
-        data = self.data(source="primary").loc[idx]
+        data = self.data(source="primary", columns=columns).loc[idx]
         if isinstance(transform, dict):
+            if columns is not None:
+                transform = {k: v for k, v in transform.items() if k in data.columns}
             data = apply_transform(data=data, features_to_transform=transform)
         elif isinstance(transform, str):
             data = apply_transform(data, transform_method=transform)
@@ -477,12 +537,12 @@ class FileGroup(mongoengine.Document):
         Pandas.DataFrame
         """
 
-        data["population_label"] = None
-        dependencies = self.list_downstream_populations(parent)
-        for pop in dependencies:
-            idx = self.get_population(pop).index
-            data.loc[idx, 'label'] = pop
-        data["population_label"].fillna(parent, inplace=True)
+        labels = np.full(data.shape[0], parent, dtype=object)
+        # Dependencies are listed in pre-order, so deeper populations overwrite their parents
+        for pop in self.list_downstream_populations(parent):
+            positions = data.index.get_indexer(self.get_population(pop).index)
+            labels[positions[positions != -1]] = pop
+        data["population_label"] = labels
         return data
 
     def _hdf5_exists(self):
@@ -621,7 +681,7 @@ class FileGroup(mongoengine.Document):
         -------
         Population
         """
-        assert population_name in list(self.list_populations()), f'Population {population_name} does not exist'
+        assert population_name in self.list_populations(), f'Population {population_name} does not exist'
         return [p for p in self.populations if p.population_name == population_name][0]
 
     def get_population_by_parent(self,
@@ -711,7 +771,7 @@ class FileGroup(mongoengine.Document):
 
         """
         same_parent = left.parent == right.parent
-        downstream = right.population_name in list(self.list_downstream_populations(left.population_name))
+        downstream = right.population_name in self.list_downstream_populations(left.population_name)
         assert same_parent or downstream, "Right population should share the same parent as the " \
                                           "left population or be downstream of the left population"
         new_population_name = new_population_name or f"subtract_{left.population_name}_{right.population_name}"
@@ -754,13 +814,14 @@ class FileGroup(mongoengine.Document):
                 parent_n = self.get_population(p.parent).n
                 p.prop_of_parent = p.n / parent_n
                 p.prop_of_total = p.n / root_n
-                f.create_dataset(f'/index/{p.population_name}/primary', data=p.index)
+                f.create_dataset(f'/index/{p.population_name}/primary', data=p.index, **INDEX_DATASET_OPTIONS)
                 for ctrl, idx in p.ctrl_index.items():
-                    f.create_dataset(f'/index/{p.population_name}/{ctrl}', data=idx)
+                    f.create_dataset(f'/index/{p.population_name}/{ctrl}', data=idx, **INDEX_DATASET_OPTIONS)
                 for cluster in p.clusters:
                     cluster.prop_of_events = cluster.n / p.n
                     f.create_dataset(f'/clusters/{p.population_name}/{cluster.cluster_id}',
-                                     data=cluster.index)
+                                     data=cluster.index,
+                                     **INDEX_DATASET_OPTIONS)
 
     def _hdf_reset_population_data(self):
         """
@@ -842,4 +903,4 @@ def population_stats(filegroup: FileGroup) -> pd.DataFrame:
     Pandas.DataFrame
     """
     return pd.DataFrame([filegroup.population_stats(p)
-                         for p in list(filegroup.list_populations())])
\ No newline at end of file
+                         for p in filegroup.list_populations()])
\ No newline at end of file
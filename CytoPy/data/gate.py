@@ -33,12 +33,11 @@ SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 from ..flow.transforms import apply_transform
 from .geometry import ThresholdGeom, PolygonGeom, inside_polygon, \
     create_convex_hull, create_polygon, polygon_overlap, ellipse_to_polygon, \
-    probablistic_ellipse
+    probablistic_ellipse, union_polygons
 from .population import Population, merge_multiple_populations, create_signature
 from ..flow.sampling import faithful_downsampling, density_dependent_downsampling, upsample_knn
 from ..flow.dim_reduction import dimensionality_reduction
 from shapely.geometry import Polygon as ShapelyPoly
-from shapely.ops import cascaded_union
 from sklearn.cluster import *
 from sklearn.mixture import *
 from hdbscan import HDBSCAN
@@ -962,8 +961,9 @@ class PolygonGate(Gate):
         """
         matched_populations = list()
         for child in self.children:
-            scores = [_child_similarity_score(child=child, population=pop)
-                      for pop in new_populations]
+            overlaps = child.geom.intersects_many([pop.geom.shape for pop in new_populations])
+            scores = [_child_similarity_score(child=child, population=pop) if overlap else 0.
+                      for pop, overlap in zip(new_populations, overlaps)]
             matching_population = new_populations[int(np.argmax(scores))]
             matching_population.population_name = child.name
             matched_populations.append(matching_population)
@@ -1035,8 +1035,7 @@ class PolygonGate(Gate):
                                      poly=poly)
             self.add_child(ChildPolygon(name=name,
                                         signature=create_signature(data=poly_df),
-                                        geom=PolygonGeom(x_values=poly.exterior.xy[0].tolist(),
-                                                         y_values=poly.exterior.xy[1].tolist())))
+                                        geom=PolygonGeom(xy=np.asarray(poly.exterior.coords))))
 
     def fit_predict(self,
                     data: pd.DataFrame) -> List[Population]:
@@ -1221,17 +1220,15 @@ def merge_children(children: list) -> Child or ChildThreshold or ChildPolygon:
                               definition=definition,
                               geom=children[0].geom)
     if isinstance(children[0], ChildPolygon):
-        merged_poly = cascaded_union([c.geom.shape for c in children])
+        merged_poly = union_polygons([c.geom.shape for c in children])
         new_signature = pd.DataFrame([c.signature for c in children]).mean().to_dict()
-        x, y = merged_poly.exterior.xy[0], merged_poly.exterior.xy[1]
         return ChildPolygon(name=children[0].name,
                             signature=new_signature,
                             geom=PolygonGeom(x=children[0].geom.x,
                                              y=children[0].geom.y,
                                              transform_x=children[0].geom.transform_x,
                                              transform_y=children[0].geom.transform_y,
-                                             x_values=x,
-                                             y_values=y))
+                                             xy=np.asarray(merged_poly.exterior.coords)))
     return children[0]
 
 
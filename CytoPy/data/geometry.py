@@ -30,13 +30,15 @@ SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import numpy as np
 import pandas as pd
-from multiprocessing import Pool, cpu_count
-from functools import partial
 from matplotlib.patches import Ellipse
 from scipy import linalg, stats
 from scipy.spatial.qhull import ConvexHull
 from shapely.geometry import Polygon, Point
+from shapely.prepared import prep
+from shapely.ops import unary_union
+from warnings import warn
 import mongoengine
+import shapely
 
 __author__ = "Ross Burton"
 __copyright__ = "Copyright 2020, CytoPy"
@@ -47,6 +49,9 @@ __maintainer__ = "Ross Burton"
 __email__ = "burtonrj@cardiff.ac.uk"
 __status__ = "Production"
 
+# Shapely >= 2.0 exposes vectorised (ufunc-style) predicates and set operations
+SHAPELY2 = int(shapely.__version__.split(".")[0]) >= 2
+
 
 class PopulationGeometry(mongoengine.EmbeddedDocument):
     """
@@ -87,38 +92,286 @@ class ThresholdGeom(PopulationGeometry):
 
 class PolygonGeom(PopulationGeometry):
     """
-    Polygon shape. Inherits from PopulationGeometry.
+    Polygon shape. Inherits from PopulationGeometry. Vertices are stored as a single
+    packed (N, 2) float64 array; x_values and y_values are provided as properties
+    for convenience and for documents saved before this change.
 
     Attributes
     -----------
+    coords: bytes
+        Packed (N, 2) float64 array of polygon vertices; set from an array using the
+        xy property (or xy keyword argument)
+    n_points: int
+        Number of vertices
     x_values: list
         X-axis coordinates
     y_values: list
         Y-axis coordinates
     """
-    x_values = mongoengine.ListField()
-    y_values = mongoengine.ListField()
+    coords = mongoengine.BinaryField()
+    n_points = mongoengine.IntField()
+    # Coordinates of documents saved as two lists; migrated to coords on first access
+    legacy_x_values = mongoengine.ListField(db_field="x_values", default=None)
+    legacy_y_values = mongoengine.ListField(db_field="y_values", default=None)
+
+    def __init__(self, *args, **kwargs):
+        self._shape = None
+        self._prepared_shape = None
+        xy = kwargs.pop("xy", None)
+        x_values, y_values = kwargs.pop("x_values", None), kwargs.pop("y_values", None)
+        super().__init__(*args, **kwargs)
+        if xy is not None:
+            self.xy = xy
+        else:
+            if x_values is not None:
+                self.x_values = x_values
+            if y_values is not None:
+                self.y_values = y_values
+
+    def __setattr__(self, key, value):
+        # Invalidate the cached shapes whenever the coordinates are replaced
+        if key == "coords":
+            self.__dict__["_shape"] = None
+            self.__dict__["_prepared_shape"] = None
+        super().__setattr__(key, value)
+
+    def __getitem__(self, name):
+        if name in ("x_values", "y_values"):
+            return getattr(self, name)
+        return super().__getitem__(name)
+
+    def _migrate_legacy(self):
+        if self.coords is None and self.legacy_x_values:
+            self.xy = np.column_stack([self.legacy_x_values, self.legacy_y_values])
+            self.legacy_x_values, self.legacy_y_values = None, None
+
+    @property
+    def xy(self):
+        """
+        Polygon vertices as a read-only (N, 2) float64 array, viewed directly
+        over the stored buffer.
+
+        Returns
+        -------
+        Numpy.array
+        """
+        self._migrate_legacy()
+        if self.coords is None:
+            return np.empty((0, 2), dtype=np.float64)
+        return np.frombuffer(self.coords, dtype=np.float64).reshape(-1, 2)
+
+    @xy.setter
+    def xy(self, xy: np.array):
+        xy = np.ascontiguousarray(xy, dtype=np.float64)
+        assert xy.ndim == 2 and xy.shape[1] == 2, "Polygon coordinates should be an (N, 2) array"
+        self.__dict__["_pending_axes"] = {}
+        self.coords = xy.tobytes()
+        self.n_points = xy.shape[0]
+
+    def _get_axis(self, axis: int) -> list:
+        pending = self.__dict__.get("_pending_axes") or {}
+        if axis in pending:
+            return pending[axis].tolist()
+        return self.xy[:, axis].tolist()
+
+    def _set_axis(self, axis: int, values: list):
+        """
+        Set the coordinates of one axis. If the length of the given values does not match
+        the stored coordinates (e.g. a new polygon), they are held until the other axis
+        is given with a matching length and then packed together.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        pending = self.__dict__.setdefault("_pending_axes", {})
+        pending[axis] = values
+        other = pending.get(1 - axis)
+        if other is None and self.xy.shape[0] == values.shape[0]:
+            other = self.xy[:, 1 - axis]
+        if other is not None and other.shape[0] == values.shape[0]:
+            self.xy = np.column_stack([values, other] if axis == 0 else [other, values])
+
+    @property
+    def x_values(self):
+        return self._get_axis(0)
+
+    @x_values.setter
+    def x_values(self, x_values: list):
+        self._set_axis(0, x_values)
+
+    @property
+    def y_values(self):
+        return self._get_axis(1)
+
+    @y_values.setter
+    def y_values(self, y_values: list):
+        self._set_axis(1, y_values)
 
     @property
     def shape(self):
-        assert self.x_values is not None and self.y_values is not None, \
-            "x and y values not defined for this Polygon"
-        return create_polygon(self.x_values, self.y_values)
+        """
+        Shapely Polygon generated from the stored coordinates. The Polygon is constructed
+        once and cached; it is rebuilt if the coordinates are reassigned.
+
+        Returns
+        -------
+        shapely.geometry.Polygon
+        """
+        xy = self.xy
+        assert xy.shape[0] > 0, "x and y values not defined for this Polygon"
+        if getattr(self, "_shape", None) is None:
+            self._shape = Polygon(xy)
+        return self._shape
 
+    @property
+    def prepared_shape(self):
+        """
+        Prepared (indexed) version of shape, for fast repeated predicate queries
+        against this polygon. Cached in the same manner as shape.
+
+        Returns
+        -------
+        shapely.prepared.PreparedGeometry
+        """
+        if getattr(self, "_prepared_shape", None) is None:
+            self._prepared_shape = prep(self.shape)
+        return self._prepared_shape
+
+    def contains_points(self,
+                        xs: np.array,
+                        ys: np.array) -> np.array:
+        """
+        Vectorised point-in-polygon test for many points at once, avoiding the
+        construction of a shapely Point per event. Points on the boundary are
+        excluded, as with Polygon.contains.
+
+        Parameters
+        ----------
+        xs: Numpy.array
+            X-axis coordinates of the points to test
+        ys: Numpy.array
+            Y-axis coordinates of the points to test
+
+        Returns
+        -------
+        Numpy.array
+            Boolean array, True where the point is contained
+        """
+        return points_in_polygon(xs, ys, self.shape)
+
+    def contains_many(self,
+                      points: np.array) -> np.array:
+        """
+        Test if each of the given points falls within this polygon; equivalent to
+        contains_points for an (N, 2) matrix of points.
+
+        Parameters
+        ----------
+        points: Numpy.array
+            two dimensional matrix (x,y)
+
+        Returns
+        -------
+        Numpy.array
+            Boolean array, True where the point is contained
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return self.contains_points(points[:, 0], points[:, 1])
+
+    def intersects_many(self,
+                        geoms: list) -> np.array:
+        """
+        Test if each of the given geometries intersects this polygon.
+
+        Parameters
+        ----------
+        geoms: list
+            List of shapely geometries
+
+        Returns
+        -------
+        Numpy.array
+            Boolean array, True where the geometry intersects
+        """
+        prepared = self.prepared_shape
+        return np.array([prepared.intersects(g) for g in geoms], dtype=bool)
+
+    def overlap(self,
+                comparison_poly: Polygon,
+                threshold: float = 0.):
+        """
+        For a given polygon, give the fraction overlap with this PolygonGeom shape.
+        Fraction overlap is given as the area of the intersection of the two polygons
+        divided by the area of this PolygonGeom. If the fraction overlap does not exceed
+        the given threshold or the polygons do not overlap, returns 0.0
+
+        Parameters
+        ----------
+        comparison_poly: Polygon
+        threshold: float (default = 0.0)
+
+        Returns
+        -------
+        float
+        """
+        return polygon_overlap(self.shape, comparison_poly, threshold)
+
+
+def points_in_polygon(xs: np.array,
+                      ys: np.array,
+                      poly: Polygon) -> np.array:
+    """
+    Vectorised point-in-polygon test, evaluated for all points in a single call rather
+    than constructing a shapely Point per event. Semantics match Polygon.contains, so
+    points lying on the polygon boundary are excluded and holes are respected.
+
+    Parameters
+    ----------
+    xs: Numpy.array
+        X-axis coordinates of the points to test
+    ys: Numpy.array
+        Y-axis coordinates of the points to test
+    poly: shapely.geometry.Polygon
+        Polygon to test against
 
-def point_in_poly(coords: np.array,
-                  poly: Polygon):
-    point = Point(coords)
-    return poly.contains(point)
+    Returns
+    -------
+    Numpy.array
+        Boolean array, True where the point falls inside the polygon
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    if SHAPELY2:
+        return shapely.contains_xy(poly, xs, ys)
+    from shapely import vectorized
+    return vectorized.contains(poly, xs, ys)
+
+
+def signed_area(poly_xy: np.array) -> float:
+    """
+    Signed area of a polygon using the shoelace formula. Positive for vertices
+    ordered anti-clockwise, negative for clockwise.
+
+    Parameters
+    ----------
+    poly_xy: Numpy.array
+        (N, 2) array of polygon vertices
+
+    Returns
+    -------
+    float
+    """
+    poly_xy = np.asarray(poly_xy, dtype=np.float64)
+    x, y = poly_xy[:, 0], poly_xy[:, 1]
+    return float(0.5 * (np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))))
 
 
 def inside_polygon(df: pd.DataFrame,
                    x: str,
                    y: str,
                    poly: Polygon,
-                   njobs: int = -1):
+                   njobs: int or None = None):
     """
-    Return rows in dataframe who's values for x and y are contained in some polygon coordinate shape
+    Return rows in dataframe who's values for x and y are contained in some polygon coordinate shape.
+    Points lying on the polygon boundary are excluded, as with Polygon.contains.
 
     Parameters
     ----------
@@ -130,21 +383,18 @@ def inside_polygon(df: pd.DataFrame,
         name of y-axis plane
     poly: shapely.geometry.Polygon
         Polygon object to search
-    njobs: int
-        Number of jobs to run in parallel, by default uses all available cores
+    njobs: int, optional
+        Deprecated and ignored; the test is vectorised and runs in a single process
 
     Returns
     --------
     Pandas.DataFrame
         Masked DataFrame containing only those rows that fall within the Polygon
     """
-    if njobs < 0:
-        njobs = cpu_count()
-    xy = df[[x, y]].values
-    f = partial(point_in_poly, poly=poly)
-    with Pool(njobs) as pool:
-        mask = list(pool.map(f, xy))
-    return df.iloc[mask]
+    if njobs is not None:
+        warn("inside_polygon no longer uses multiprocessing; the 'njobs' argument is deprecated and ignored",
+             DeprecationWarning)
+    return df.iloc[points_in_polygon(df[x].values, df[y].values, poly)]
 
 
 def polygon_overlap(poly1: Polygon,
@@ -165,11 +415,29 @@ def polygon_overlap(poly1: Polygon,
     -------
     float
     """
-    if poly1.intersects(poly2):
-        overlap = float(poly1.intersection(poly2).area / poly1.area)
-        if overlap >= threshold:
-            return overlap
-    return 0.
+    intersection = poly1.intersection(poly2)
+    if intersection.is_empty:
+        return 0.
+    overlap = float(intersection.area / poly1.area)
+    return overlap if overlap >= threshold else 0.
+
+
+def union_polygons(polygons: np.ndarray or list):
+    """
+    Union of the given shapely geometries. With Shapely >= 2.0 this is a single
+    vectorised call over the whole array, otherwise falls back to shapely.ops.unary_union.
+
+    Parameters
+    ----------
+    polygons: Numpy.Array or list
+
+    Returns
+    -------
+    shapely.geometry.base.BaseGeometry
+    """
+    if SHAPELY2:
+        return shapely.union_all(polygons)
+    return unary_union(list(polygons))
 
 
 def create_polygon(x: list,
@@ -186,7 +454,7 @@ def create_polygon(x: list,
     -------
     Polygon
     """
-    return Polygon([(x, y) for x, y in zip(x, y)])
+    return Polygon(np.column_stack([x, y]))
 
 
 def inside_ellipse(data: np.array,
@@ -32,14 +32,16 @@ SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
 from ..flow.transforms import scaler
-from .geometry import PopulationGeometry, ThresholdGeom, PolygonGeom
+from .geometry import PopulationGeometry, ThresholdGeom, PolygonGeom, union_polygons, SHAPELY2
 from functools import reduce
-from shapely.ops import unary_union
+from collections import defaultdict
+from shapely.strtree import STRtree
 from typing import List
 from _warnings import warn
 import numpy as np
 import pandas as pd
 import mongoengine
+import shapely
 
 __author__ = "Ross Burton"
 __copyright__ = "Copyright 2020, CytoPy"
@@ -51,6 +53,23 @@ __email__ = "burtonrj@cardiff.ac.uk"
 __status__ = "Production"
 
 
+def _as_index(idx: np.ndarray or list) -> np.ndarray:
+    """
+    Coerce an index of events to a contiguous one dimensional array of 32-bit integers.
+
+    Parameters
+    ----------
+    idx: Numpy.Array or list
+
+    Returns
+    -------
+    Numpy.Array
+    """
+    idx = np.ascontiguousarray(idx, dtype=np.int32)
+    assert idx.ndim == 1, "idx should be one dimensional"
+    return idx
+
+
 class Cluster(mongoengine.EmbeddedDocument):
     """
     Represents a single cluster generated by a clustering experiment on a single file.
@@ -79,7 +98,8 @@ class Cluster(mongoengine.EmbeddedDocument):
     tag = mongoengine.StringField(required=True)
 
     def __init__(self, *args, **kwargs):
-        self._index = kwargs.pop("index", None)
+        idx = kwargs.pop("index", None)
+        self._index = _as_index(idx) if idx is not None else None
         super().__init__(*args, **kwargs)
 
     @property
@@ -89,7 +109,7 @@ class Cluster(mongoengine.EmbeddedDocument):
     @index.setter
     def index(self, idx: np.array or list):
         self.n = len(idx)
-        self._index = np.array(idx)
+        self._index = _as_index(idx)
 
 
 class Population(mongoengine.EmbeddedDocument):
@@ -142,10 +162,18 @@ class Population(mongoengine.EmbeddedDocument):
 
     def __init__(self, *args, **kwargs):
         # If the Population existed previously, fetched the index
-        self._index = kwargs.pop("index", None)
+        idx = kwargs.pop("index", None)
+        self._index = _as_index(idx) if idx is not None else None
         self._ctrl_index = kwargs.pop("ctrl_index", dict())
+        self._cluster_keys = None
         super().__init__(*args, **kwargs)
 
+    def __setattr__(self, key, value):
+        # Invalidate the cached cluster keys whenever the clusters are replaced
+        if key == "clusters":
+            self.__dict__["_cluster_keys"] = None
+        super().__setattr__(key, value)
+
     @property
     def index(self):
         return self._index
@@ -154,7 +182,7 @@ class Population(mongoengine.EmbeddedDocument):
     def index(self, idx: np.array):
         assert isinstance(idx, np.ndarray), "idx should be type numpy.array"
         self.n = len(idx)
-        self._index = np.array(idx)
+        self._index = _as_index(idx)
 
     @property
     def ctrl_index(self):
@@ -163,7 +191,7 @@ class Population(mongoengine.EmbeddedDocument):
     def set_ctrl_index(self, **kwargs):
         for k, v in kwargs.items():
             assert isinstance(v, np.ndarray), "ctrl_idx should be type numpy.array"
-            self._ctrl_index[k] = v
+            self._ctrl_index[k] = _as_index(v)
 
     def add_cluster(self,
                     cluster: Cluster):
@@ -180,8 +208,11 @@ class Population(mongoengine.EmbeddedDocument):
         """
         _id, tag = cluster.cluster_id, cluster.tag
         err = f"Cluster already exists with id: {_id}; tag: {tag}"
-        assert not any([x.cluster_id == _id and x.tag == tag for x in self.clusters]), err
+        if getattr(self, "_cluster_keys", None) is None:
+            self._cluster_keys = set([(x.cluster_id, x.tag) for x in self.clusters])
+        assert (_id, tag) not in self._cluster_keys, err
         self.clusters.append(cluster)
+        self._cluster_keys.add((_id, tag))
 
     def delete_cluster(self,
                        cluster_id: str or None = None,
@@ -304,6 +335,103 @@ def _check_overlap(left: Population,
     return overlap
 
 
+def _shapes_array(populations: List[Population]) -> np.ndarray:
+    """
+    Given a list of Populations with Polygon geoms, return a one dimensional
+    object array of their shapely Polygons.
+
+    Parameters
+    ----------
+    populations: list
+
+    Returns
+    -------
+    Numpy.Array
+    """
+    shapes = np.empty(len(populations), dtype=object)
+    for i, p in enumerate(populations):
+        shapes[i] = p.geom.shape
+    return shapes
+
+
+def build_population_index(populations: List[Population]) -> STRtree:
+    """
+    Build a spatial index (STRtree) over the Polygon geometries of the given Populations.
+    Items in the tree are referenced by their position in 'populations'.
+
+    Parameters
+    ----------
+    populations: list
+
+    Returns
+    -------
+    shapely.strtree.STRtree
+    """
+    assert all([isinstance(x.geom, PolygonGeom) for x in populations]), \
+        "Only Polygon geometries can be indexed"
+    return STRtree(list(_shapes_array(populations)))
+
+
+def find_overlapping_pairs(populations: List[Population],
+                           threshold: float = 0.) -> (np.ndarray, np.ndarray):
+    """
+    Given a list of Populations with Polygon geoms, find all pairs of populations whose
+    geometries overlap. Candidate pairs are found with a spatial index so that only
+    pairs with intersecting bounding boxes are tested, avoiding comparison of every pair.
+    The fraction overlap of each pair is the area of intersection divided by the area of
+    the first population in the pair; pairs with a fraction overlap below the given
+    threshold are dropped.
+
+    Parameters
+    ----------
+    populations: list
+    threshold: float (default = 0.0)
+
+    Returns
+    -------
+    Numpy.Array, Numpy.Array
+        Array of shape (K, 2) of index pairs (i, j) where i < j, and array of length K
+        of the fraction overlap of each pair
+    """
+    shapes = _shapes_array(populations)
+    tree = build_population_index(populations)
+    if SHAPELY2:
+        left, right = tree.query(shapes, predicate="intersects")
+    else:
+        # Prior to Shapely 2.0 the tree returns geometries, not positions
+        position = {id(shp): i for i, shp in enumerate(shapes)}
+        pairs = [(i, position[id(other)]) for i, shp in enumerate(shapes)
+                 for other in tree.query(shp) if shp.intersects(other)]
+        left, right = np.array(pairs, dtype=int).reshape(-1, 2).T
+    mask = left < right
+    left, right = left[mask], right[mask]
+    if SHAPELY2:
+        overlap = shapely.area(shapely.intersection(shapes[left], shapes[right])) / shapely.area(shapes[left])
+    else:
+        overlap = np.array([shapes[i].intersection(shapes[j]).area / shapes[i].area
+                            for i, j in zip(left, right)], dtype=float)
+    keep = overlap >= threshold
+    return np.column_stack([left[keep], right[keep]]), overlap[keep]
+
+
+def _geom_key(population: Population) -> tuple:
+    """
+    Axis and transformation definition of a Population's geometry, as a single
+    tuple that can be compared or hashed.
+
+    Parameters
+    ----------
+    population: Population
+
+    Returns
+    -------
+    tuple
+        (x, y, transform_x, transform_y)
+    """
+    geom = population.geom
+    return geom.x, geom.y, geom.transform_x, geom.transform_y
+
+
 def _check_transforms_dimensions(left: Population,
                                  right: Population):
     """
@@ -318,6 +446,8 @@ def _check_transforms_dimensions(left: Population,
     -------
     None
     """
+    if _geom_key(left) == _geom_key(right):
+        return
     assert left.geom.transform_x == right.geom.transform_x, \
         "X dimension transform differs between left and right populations"
     assert left.geom.transform_y == right.geom.transform_y, \
@@ -326,6 +456,24 @@ def _check_transforms_dimensions(left: Population,
     assert left.geom.y == right.geom.y, "Y dimension differs between left and right populations"
 
 
+def _check_transforms_dimensions_many(populations: List[Population]):
+    """
+    Given a list of Populations, checks that they all share the same transformation methods
+    and axis. Raises assertion error if not.
+
+    Parameters
+    ----------
+    populations: list
+
+    Returns
+    -------
+    None
+    """
+    keys = set([_geom_key(p) for p in populations])
+    assert len(keys) == 1, "Populations must share the same dimensions and transforms; " \
+                           f"(x, y, transform_x, transform_y) found: {keys}"
+
+
 def _merge_index(left: Population,
                  right: Population) -> np.ndarray:
     """
@@ -340,7 +488,119 @@ def _merge_index(left: Population,
     -------
     Numpy.Array
     """
-    return np.unique(np.concatenate([left.index, right.index], axis=0), axis=0)
+    return _union_index(left.index, right.index)
+
+
+def _union_index(left_idx: np.ndarray,
+                 right_idx: np.ndarray) -> np.ndarray:
+    """
+    Sorted union of two index arrays.
+
+    Parameters
+    ----------
+    left_idx: Numpy.Array
+    right_idx: Numpy.Array
+
+    Returns
+    -------
+    Numpy.Array
+    """
+    if _is_sorted(left_idx) and _is_sorted(right_idx):
+        # When one index is much smaller, insert it into the larger rather than sorting both
+        if len(right_idx) * 8 < len(left_idx):
+            return _insert_sorted(left_idx, right_idx)
+        if len(left_idx) * 8 < len(right_idx):
+            return _insert_sorted(right_idx, left_idx)
+        merged = np.concatenate([left_idx, right_idx])
+        # A stable sort (timsort) merges the two presorted runs in linear time
+        merged.sort(kind="stable")
+        return _unique_sorted(merged)
+    return np.unique(np.concatenate([left_idx, right_idx]))
+
+
+def _insert_sorted(large: np.ndarray,
+                   small: np.ndarray) -> np.ndarray:
+    """
+    Sorted union of two sorted index arrays, inserting the values of the smaller array
+    that are missing from the larger one. Costs O(M log N) searching rather than a sort
+    of the combined array. The larger array is expected to be free of duplicates, as is
+    the case for population indexes.
+
+    Parameters
+    ----------
+    large: Numpy.Array
+    small: Numpy.Array
+
+    Returns
+    -------
+    Numpy.Array
+    """
+    small = _unique_sorted(small)
+    if large.size == 0:
+        return small
+    pos = np.searchsorted(large, small)
+    missing = large[np.minimum(pos, large.size - 1)] != small
+    return np.insert(large, pos[missing], small[missing])
+
+
+def _is_sorted(idx: np.ndarray) -> bool:
+    """
+    Check if the given one dimensional array is sorted in ascending order.
+
+    Parameters
+    ----------
+    idx: Numpy.Array
+
+    Returns
+    -------
+    bool
+    """
+    return bool(np.all(idx[1:] >= idx[:-1]))
+
+
+def _unique_sorted(idx: np.ndarray) -> np.ndarray:
+    """
+    Drop duplicate values from an array already sorted in ascending order. Equivalent
+    to Numpy.unique but avoids a second sort.
+
+    Parameters
+    ----------
+    idx: Numpy.Array
+
+    Returns
+    -------
+    Numpy.Array
+    """
+    if idx.size == 0:
+        return idx
+    mask = np.empty(idx.size, dtype=bool)
+    mask[0] = True
+    np.not_equal(idx[1:], idx[:-1], out=mask[1:])
+    return idx[mask]
+
+
+def _merge_many_index(indexes: List[np.ndarray]) -> np.ndarray:
+    """
+    Sorted union of many index arrays. The output is allocated once and filled in a
+    single pass, then sorted and de-duplicated once, rather than merging pairwise.
+
+    Parameters
+    ----------
+    indexes: list
+        List of index arrays
+
+    Returns
+    -------
+    Numpy.Array
+    """
+    sizes = np.fromiter((len(idx) for idx in indexes), dtype=np.int64, count=len(indexes))
+    merged = np.empty(sizes.sum(), dtype=np.int32)
+    offset = 0
+    for idx, size in zip(indexes, sizes):
+        merged[offset:offset + size] = idx
+        offset += size
+    merged.sort()
+    return _unique_sorted(merged)
 
 
 def _merge_signatures(left: Population,
@@ -357,7 +617,71 @@ def _merge_signatures(left: Population,
     -------
     dict
     """
-    return pd.DataFrame([left.signature, right.signature]).mean().to_dict()
+    return _mean_signatures([left.signature, right.signature])
+
+
+def _mean_signatures(signatures: List[dict]) -> dict:
+    """
+    Element-wise mean of many signatures. Where a feature is missing from some
+    signatures, the mean is taken over the signatures in which it is present.
+
+    Parameters
+    ----------
+    signatures: list
+        List of signatures; {column name: summary statistic}
+
+    Returns
+    -------
+    dict
+    """
+    totals, counts = dict(), dict()
+    for sig in signatures:
+        for k, v in sig.items():
+            totals[k] = totals.get(k, 0.) + v
+            counts[k] = counts.get(k, 0) + 1
+    return {k: totals[k] / counts[k] for k in totals}
+
+
+def _merge_clusters(populations: List[Population],
+                    n: int) -> List[Cluster]:
+    """
+    Merge the clusters of many populations. Clusters sharing the same cluster ID and tag
+    are combined by taking the union of their indexes; all other clusters are carried
+    over unchanged, so clustering does not have to be repeated on the merged population.
+
+    Parameters
+    ----------
+    populations: list
+    n: int
+        Number of events in the merged population; prop_of_events of each cluster is
+        relative to this (as in FileGroup.save)
+
+    Returns
+    -------
+    List
+        List of Cluster objects
+    """
+    grouped = defaultdict(list)
+    for p in populations:
+        for c in p.clusters:
+            grouped[(c.cluster_id, c.tag)].append(c)
+    clusters = list()
+    for group in grouped.values():
+        first = group[0]
+        if len(group) == 1:
+            # Copy rather than share the embedded document with the source population
+            idx = None if first.index is None else first.index.copy()
+            cluster_n = first.n
+        else:
+            idx = _merge_many_index([c.index for c in group])
+            cluster_n = len(idx)
+        clusters.append(Cluster(cluster_id=first.cluster_id,
+                                meta_label=first.meta_label,
+                                tag=first.tag,
+                                index=idx,
+                                n=cluster_n,
+                                prop_of_events=cluster_n / n if n else 0.))
+    return clusters
 
 
 def _merge_thresholds(left: Population,
@@ -382,9 +706,6 @@ def _merge_thresholds(left: Population,
     assert left.geom.y_threshold == right.geom.y_threshold, \
         "Threshold merge assumes that the populations are derived " \
         "from the same gate; Y threshold should match between populations"
-    if left.clusters or right.clusters:
-        warn("Associated clusters are now void. Repeat clustering on new population")
-        left.clusters, right_clusters = [], []
     if len(left.ctrl_index) > 0 or len(right.ctrl_index) > 0:
         warn("Associated control indexes are now void. Repeat control gating on new population")
     new_geom = ThresholdGeom(x=left.geom.x,
@@ -394,14 +715,16 @@ def _merge_thresholds(left: Population,
                              x_threshold=left.geom.x_threshold,
                              y_threshold=left.geom.y_threshold)
 
+    n = len(left.index) + len(right.index)
     new_population = Population(population_name=new_population_name,
-                                n=len(left.index) + len(right.index),
+                                n=n,
                                 parent=left.parent,
                                 warnings=left.warnings + right.warnings + ["MERGED POPULATION"],
                                 index=_merge_index(left, right),
                                 geom=new_geom,
                                 definition=",".join([left.definition, right.definition]),
-                                signature=_merge_signatures(left, right))
+                                signature=_merge_signatures(left, right),
+                                clusters=_merge_clusters([left, right], n))
     return new_population
 
 
@@ -422,14 +745,12 @@ def _merge_polygons(left: Population,
     Population
     """
     _check_overlap(left, right)
-    new_shape = unary_union([p.geom.shape for p in [left, right]])
-    x, y = new_shape.exterior.coords.xy
+    new_shape = union_polygons(_shapes_array([left, right]))
     new_geom = PolygonGeom(x=left.geom.x,
                            y=left.geom.y,
                            transform_x=left.geom.transform_x,
                            transform_y=left.geom.transform_y,
-                           x_values=x,
-                           y_values=y)
+                           xy=np.asarray(new_shape.exterior.coords))
     new_idx = _merge_index(left, right)
     new_population = Population(population_name=new_population_name,
                                 n=len(new_idx),
@@ -437,10 +758,16 @@ def _merge_polygons(left: Population,
                                 warnings=left.warnings + right.warnings + ["MERGED POPULATION"],
                                 index=new_idx,
                                 geom=new_geom,
-                                signature=_merge_signatures(left, right))
+                                signature=_merge_signatures(left, right),
+                                clusters=_merge_clusters([left, right], len(new_idx)))
     return new_population
 
 
+# Merge method for each supported geometry type
+_MERGE_DISPATCH = {ThresholdGeom: _merge_thresholds,
+                   PolygonGeom: _merge_polygons}
+
+
 def merge_populations(left: Population,
                       right: Population,
                       new_population_name: str or None = None):
@@ -463,9 +790,11 @@ def merge_populations(left: Population,
     assert left.parent == right.parent, "Parent populations do not match"
     assert isinstance(left.geom, type(
         right.geom)), f"Geometries must be of the same type; left={type(left.geom)}, right={type(right.geom)}"
-    if isinstance(left.geom, ThresholdGeom):
-        return _merge_thresholds(left, right, new_population_name)
-    return _merge_polygons(left, right, new_population_name)
+    try:
+        merge = _MERGE_DISPATCH[type(left.geom)]
+    except KeyError:
+        raise TypeError(f"Merging is not supported for geometries of type {type(left.geom)}")
+    return merge(left, right, new_population_name)
 
 
 def merge_multiple_populations(populations: List[Population],
@@ -487,11 +816,107 @@ def merge_multiple_populations(populations: List[Population],
         assert len(set([p.population_name for p in populations])) == 1, \
             "If a new population name is not given the populations are expected to have the same population name"
     new_population_name = new_population_name or populations[0].population_name
+    geom_types = set([type(p.geom) for p in populations])
+    if len(populations) > 2 and len(geom_types) == 1 and geom_types.issubset(_MERGE_MULTIPLE_DISPATCH):
+        return _MERGE_MULTIPLE_DISPATCH[geom_types.pop()](populations, new_population_name)
     merged_pop = reduce(lambda p1, p2: merge_populations(p1, p2), populations)
     merged_pop.population_name = new_population_name
     return merged_pop
 
 
+def _merge_multiple_polygons(populations: List[Population],
+                             new_population_name: str):
+    """
+    Merge many Populations with PolygonGeom geometries at once. The union of all
+    polygons is computed in a single call rather than by repeated pairwise merging.
+    The merged polygons must form a single contiguous polygon.
+
+    Parameters
+    ----------
+    populations: list
+    new_population_name: str
+
+    Returns
+    -------
+    Population
+    """
+    left = populations[0]
+    _check_transforms_dimensions_many(populations)
+    assert len(set([p.parent for p in populations])) == 1, "Parent populations do not match"
+    pairs, _ = find_overlapping_pairs(populations)
+    assert np.isin(np.arange(len(populations)), pairs).all(), "Invalid: non-overlapping populations"
+    new_shape = union_polygons(_shapes_array(populations))
+    assert new_shape.geom_type == "Polygon", "Invalid: non-overlapping populations"
+    new_geom = PolygonGeom(x=left.geom.x,
+                           y=left.geom.y,
+                           transform_x=left.geom.transform_x,
+                           transform_y=left.geom.transform_y,
+                           xy=np.asarray(new_shape.exterior.coords))
+    new_idx = _merge_many_index([p.index for p in populations])
+    warnings = [w for p in populations for w in p.warnings] + ["MERGED POPULATION"]
+    new_population = Population(population_name=new_population_name,
+                                n=len(new_idx),
+                                parent=left.parent,
+                                warnings=warnings,
+                                index=new_idx,
+                                geom=new_geom,
+                                signature=_mean_signatures([p.signature for p in populations]),
+                                clusters=_merge_clusters(populations, len(new_idx)))
+    return new_population
+
+
+def _merge_multiple_thresholds(populations: List[Population],
+                               new_population_name: str):
+    """
+    Merge many Populations with ThresholdGeom geometries at once. Indexes are combined
+    in a single pass rather than by repeated pairwise merging.
+
+    Parameters
+    ----------
+    populations: list
+    new_population_name: str
+
+    Returns
+    -------
+    Population
+    """
+    left = populations[0]
+    _check_transforms_dimensions_many(populations)
+    assert len(set([p.parent for p in populations])) == 1, "Parent populations do not match"
+    for right in populations[1:]:
+        assert left.geom.x_threshold == right.geom.x_threshold, \
+            "Threshold merge assumes that the populations are derived " \
+            "from the same gate; X threshold should match between populations"
+        assert left.geom.y_threshold == right.geom.y_threshold, \
+            "Threshold merge assumes that the populations are derived " \
+            "from the same gate; Y threshold should match between populations"
+    if any([len(p.ctrl_index) > 0 for p in populations]):
+        warn("Associated control indexes are now void. Repeat control gating on new population")
+    new_geom = ThresholdGeom(x=left.geom.x,
+                             y=left.geom.y,
+                             transform_x=left.geom.transform_x,
+                             transform_y=left.geom.transform_y,
+                             x_threshold=left.geom.x_threshold,
+                             y_threshold=left.geom.y_threshold)
+    new_idx = _merge_many_index([p.index for p in populations])
+    warnings = [w for p in populations for w in p.warnings] + ["MERGED POPULATION"]
+    new_population = Population(population_name=new_population_name,
+                                n=len(new_idx),
+                                parent=left.parent,
+                                warnings=warnings,
+                                index=new_idx,
+                                geom=new_geom,
+                                definition=",".join([p.definition for p in populations]),
+                                signature=_mean_signatures([p.signature for p in populations]),
+                                clusters=_merge_clusters(populations, len(new_idx)))
+    return new_population
+
+
+# Bulk merge method for each supported geometry type
+_MERGE_MULTIPLE_DISPATCH = {ThresholdGeom: _merge_multiple_thresholds,
+                            PolygonGeom: _merge_multiple_polygons}
+
+
 def create_signature(data: pd.DataFrame,
                      idx: np.array or None = None,
                      summary_method: callable or None = None) -> dict:
@@ -33,10 +33,14 @@ SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
 from .experiment import Experiment
-from .subject import Subject
+from .subject import Subject, _subject_biology
+from .fcs import FileGroup, hdf5_filepath
 from typing import Generator
+from warnings import warn
+from mongoengine.context_managers import no_dereference
 import mongoengine
 import datetime
+import os
 
 __author__ = "Ross Burton"
 __copyright__ = "Copyright 2020, CytoPy"
@@ -81,6 +85,59 @@ class Project(mongoengine.Document):
         'collection': 'projects'
     }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._experiment_ids = None
+        self._subject_ids = None
+
+    def reload(self, *fields, **kwargs):
+        # References may have changed in the database; rebuild the ID caches on next use
+        self._experiment_ids, self._subject_ids = None, None
+        return super().reload(*fields, **kwargs)
+
+    def _reference_ids(self, field: str) -> list:
+        """
+        ObjectIds of the documents referenced by the given ListField. References are
+        read without dereferencing so that referenced documents are not fetched.
+
+        Parameters
+        ----------
+        field: str
+            Either 'experiments' or 'subjects'
+
+        Returns
+        -------
+        list
+        """
+        with no_dereference(Project):
+            return [ref.id for ref in self[field]]
+
+    def _experiment_id_set(self) -> frozenset:
+        """
+        Set of associated experiment IDs, cached after the first call so that
+        membership checks do not require fetching every Experiment document.
+
+        Returns
+        -------
+        frozenset
+        """
+        if self._experiment_ids is None:
+            self._experiment_ids = frozenset(self.list_experiments())
+        return self._experiment_ids
+
+    def _subject_id_set(self) -> frozenset:
+        """
+        Set of associated subject IDs, cached after the first call so that
+        membership checks do not require fetching every Subject document.
+
+        Returns
+        -------
+        frozenset
+        """
+        if self._subject_ids is None:
+            self._subject_ids = frozenset(self.list_subjects())
+        return self._subject_ids
+
     def list_experiments(self) -> Generator:
         """
         Generate a list of associated flow cytometry experiments
@@ -90,8 +147,12 @@ class Project(mongoengine.Document):
         Generator
             list of experiment IDs
         """
-        for e in self.experiments:
-            yield e.experiment_id
+        ids = self._reference_ids("experiments")
+        experiment_ids = {e["_id"]: e["experiment_id"]
+                          for e in Experiment.objects(id__in=ids).only("experiment_id").as_pymongo()}
+        for i in ids:
+            if i in experiment_ids:
+                yield experiment_ids[i]
 
     def load_experiment(self, experiment_id: str) -> Experiment:
         """
@@ -106,7 +167,7 @@ class Project(mongoengine.Document):
         --------
         Experiment
         """
-        assert experiment_id in list(self.list_experiments()), f'Error: no experiment {experiment_id} found'
+        assert experiment_id in self._experiment_id_set(), f'Error: no experiment {experiment_id} found'
         return Experiment.objects(experiment_id=experiment_id).get()
 
     def add_experiment(self,
@@ -137,7 +198,7 @@ class Project(mongoengine.Document):
             Newly created FCSExperiment
         """
         err = f'Error: Experiment with id {experiment_id} already exists!'
-        assert experiment_id not in list(self.list_experiments()), err
+        assert experiment_id not in self._experiment_id_set(), err
         exp = Experiment(experiment_id=experiment_id,
                          panel_definition=panel_definition,
                          panel_name=panel_name,
@@ -145,6 +206,7 @@ class Project(mongoengine.Document):
         exp.save()
         self.experiments.append(exp)
         self.save()
+        self._experiment_ids = self._experiment_id_set() | {experiment_id}
         return exp
 
     def add_subject(self,
@@ -184,6 +246,7 @@ class Project(mongoengine.Document):
         new_subject.save()
         self.subjects.append(new_subject)
         self.save()
+        self._subject_ids = self._subject_id_set() | {subject_id}
         return new_subject
 
     def list_subjects(self) -> Generator:
@@ -195,8 +258,12 @@ class Project(mongoengine.Document):
         Generator
             List of subject IDs
         """
-        for s in self.subjects:
-            yield s.subject_id
+        ids = self._reference_ids("subjects")
+        subject_ids = {s["_id"]: s["subject_id"]
+                       for s in Subject.objects(id__in=ids).only("subject_id").as_pymongo()}
+        for i in ids:
+            if i in subject_ids:
+                yield subject_ids[i]
 
     def get_subject(self,
                     subject_id: str) -> Subject:
@@ -212,8 +279,8 @@ class Project(mongoengine.Document):
         --------
         Subject
         """
-        assert subject_id in list(self.list_subjects()), f'Invalid subject ID, valid subjects: ' \
-                                                         f'{list(self.list_subjects())}'
+        assert subject_id in self._subject_id_set(), f'Invalid subject ID, valid subjects: ' \
+                                                     f'{sorted(self._subject_id_set())}'
         return Subject.objects(subject_id=subject_id).get()
 
     def delete(self, *args, **kwargs) -> None:
@@ -231,12 +298,40 @@ class Project(mongoengine.Document):
         --------
         None
         """
-        experiments = [self.load_experiment(e) for e in list(self.list_experiments())]
-        for e in experiments:
-            samples = e.list_samples()
-            for s in samples:
-                e.remove_sample(s)
-            e.delete()
-        for p in self.subjects:
-            p.delete()
-        super().delete(*args, **kwargs)
\ No newline at end of file
+        experiment_ids = self._reference_ids("experiments")
+        subject_ids = self._reference_ids("subjects")
+        file_ids = set()
+        for e in Experiment.objects(id__in=experiment_ids).only("fcs_files").as_pymongo():
+            file_ids.update(e.get("fcs_files", []))
+        for s in Subject.objects(id__in=subject_ids).only("files").as_pymongo():
+            file_ids.update(s.get("files", []))
+        _delete_filegroups(list(file_ids))
+        Experiment.objects(id__in=experiment_ids).delete()
+        Subject.objects(id__in=subject_ids).delete()
+        # Bulk deletion bypasses Subject.delete, so drop cached biology queries here
+        _subject_biology.cache_clear()
+        self._experiment_ids, self._subject_ids = None, None
+        super().delete(*args, **kwargs)
+
+
+def _delete_filegroups(file_ids: list) -> None:
+    """
+    Delete the FileGroups with the given IDs, along with their HDF5 files, using a single
+    query rather than deleting each FileGroup in turn.
+
+    Parameters
+    ----------
+    file_ids: list
+        List of FileGroup ObjectIds
+
+    Returns
+    -------
+    None
+    """
+    for f in FileGroup.objects(id__in=file_ids).only("data_directory").as_pymongo():
+        h5path = hdf5_filepath(f["data_directory"], f["_id"])
+        if os.path.isfile(h5path):
+            os.remove(h5path)
+        else:
+            warn(f"Could not locate hdf5 file {h5path}")
+    FileGroup.objects(id__in=file_ids).delete()
@@ -31,6 +31,8 @@ TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 from .fcs import FileGroup
+from functools import lru_cache
+from typing import Optional
 import mongoengine
 import numpy as np
 
@@ -186,6 +188,24 @@ class Subject(mongoengine.DynamicDocument):
         'collection': 'subjects'
     }
 
+    def save(self, *args, **kwargs):
+        """
+        Save the Subject, clearing cached pathology results (see biology)
+
+        Parameters
+        ----------
+        args:
+            Positional arguments passed to mongoengine.Document.save
+        kwargs:
+            Keyword arguments passed to mongoengine.Document.save
+
+        Returns
+        -------
+        Subject
+        """
+        _subject_biology.cache_clear()
+        return super().save(*args, **kwargs)
+
     def delete(self, *args, **kwargs):
         """
         Delete the Subject. The subject will automatically be pulled from associated Projects (reference field in
@@ -208,6 +228,7 @@ class Subject(mongoengine.DynamicDocument):
         """
         for f in self.files:
             f.delete()
+        _subject_biology.cache_clear()
         super().delete(*args, **kwargs)
 
 
@@ -315,18 +336,62 @@ def hmbpp_ribo(subject: Subject, field: str) -> str:
     str
         common value of hmbpp_status/ribo_status
     """
-    if all([b[field] is None for b in subject.infection_data]):
+    statuses = {b[field] for b in subject.infection_data}
+    if not statuses or statuses == {None}:
         return 'Unknown'
-    if all([b[field] == 'P+ve' for b in subject.infection_data]):
+    if statuses == {'P+ve'}:
         return 'P+ve'
-    if all([b[field] == 'N-ve' for b in subject.infection_data]):
+    if statuses == {'N-ve'}:
         return 'N-ve'
     return 'mixed'
 
 
-def biology(subject_id: str, test_name: str, method: str) -> np.float or None:
+BIOLOGY_SUMMARY = {"max": np.max, "min": np.min, "median": np.median, "average": np.average}
+
+
+@lru_cache(maxsize=None)
+def _subject_biology(subject_id: str) -> tuple:
     """
-    Given some test name, return a summary statistic of all results for a given patient ID
+    Fetch the (test, result) pairs of a Subject's pathology results. Results are cached
+    per subject ID; the cache is cleared whenever a Subject is saved or deleted.
+
+    Parameters
+    -----------
+    subject_id: str
+
+    Returns
+    --------
+    tuple
+    """
+    subject = Subject.objects(subject_id=subject_id).only("patient_biology").as_pymongo().get()
+    return tuple((t.get("test"), t.get("result")) for t in subject.get("patient_biology", []))
+
+
+def _summarise_results(results: iter, method: str) -> Optional[float]:
+    """
+    Summarise test results with the given method (one of 'max', 'min', 'median'
+    or 'average'; defaults to 'average')
+
+    Parameters
+    -----------
+    results: iterable
+    method: str
+
+    Returns
+    --------
+    float or None
+        Summary statistic or None if no results are given
+    """
+    results = np.fromiter(results, dtype=np.float64)
+    if results.size == 0:
+        return None
+    return BIOLOGY_SUMMARY.get(method, np.average)(results)
+
+
+def biology(subject_id: str, test_name: str, method: str) -> Optional[float]:
+    """
+    Given some test name, return a summary statistic of all results for a given patient ID.
+    Pathology results are cached per subject, so repeated calls do not query the database.
 
     Parameters
     -----------
@@ -339,20 +404,31 @@ def biology(subject_id: str, test_name: str, method: str) -> np.float or None:
 
     Returns
     --------
-    Numpy.float or None
-        Summary statistic (numpy float) or None if test does not exist
+    float or None
+        Summary statistic or None if test does not exist
     """
     if subject_id is None:
         return None
-    tests = Subject.objects(patient_id=subject_id).get().patient_biology
-    tests = [t.result for t in tests if t.test == test_name]
-    if not tests:
-        return None
-    if method == 'max':
-        return np.max(tests)
-    if method == 'min':
-        return np.min(tests)
-    if method == 'median':
-        return np.median(tests)
-    return np.average(tests)
+    return _summarise_results((result for test, result in _subject_biology(subject_id) if test == test_name),
+                              method=method)
+
+
+def biology_summary(subject: Subject, test_name: str, method: str) -> Optional[float]:
+    """
+    Given an instance of Subject and some test name, return a summary statistic of all results
+
+    Parameters
+    -----------
+    subject: Subject
+    test_name: str
+        name of test to search for
+    method: str
+        summary statistic to use
 
+    Returns
+    --------
+    float or None
+        Summary statistic or None if test does not exist
+    """
+    return _summarise_results((t.result for t in subject.patient_biology if t.test == test_name),
+                              method=method)
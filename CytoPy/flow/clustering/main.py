@@ -36,16 +36,19 @@ SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
 from ...data.experiment import Experiment
+from ...data.fcs import FileGroup
 from ...data.population import Cluster
 from ...feedback import vprint, progress_bar
-from ..feature_extraction import _fetch_subject
+from ..feature_extraction import _subject_ids_by_file
 from ..explore import Explorer
 from ..transforms import scaler
 from .consensus import ConsensusCluster
 from .flowsom import FlowSOM
 from multiprocessing import Pool, cpu_count
+from multiprocessing.pool import ThreadPool
 from sklearn.cluster import *
 from sklearn.mixture import *
+from sklearn.neighbors import NearestNeighbors
 from hdbscan import HDBSCAN
 from functools import partial
 from warnings import warn
@@ -110,10 +113,60 @@ def sklearn_clustering(data: pd.DataFrame,
     return data, None, None
 
 
+def _knn_graph(x: np.array,
+               k: int = 30,
+               metric: str = "euclidean",
+               n_jobs: int = -1):
+    """
+    Build a sparse k-nearest neighbour graph (distance weighted, excluding self) that can
+    be passed to phenograph.cluster in place of the feature matrix.
+
+    Parameters
+    ----------
+    x: Numpy.Array
+    k: int (default=30)
+    metric: str (default="euclidean")
+    n_jobs: int (default=-1)
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+    """
+    nn = NearestNeighbors(n_neighbors=k, metric=metric, n_jobs=n_jobs).fit(x)
+    return nn.kneighbors_graph(mode="distance")
+
+
+def _phenograph(x: np.array,
+                precompute_knn: bool,
+                **kwargs):
+    """
+    Call phenograph.cluster, optionally on a kNN graph precomputed with Scikit-Learn
+
+    Parameters
+    ----------
+    x: Numpy.Array
+    precompute_knn: bool
+    kwargs:
+        Keyword arguments passed to phenograph.cluster
+
+    Returns
+    -------
+    Numpy.Array, scipy.sparse.base.spmatrix, float
+    """
+    if precompute_knn:
+        kwargs = kwargs.copy()
+        x = _knn_graph(x,
+                       k=kwargs.pop("k", 30),
+                       metric=kwargs.pop("primary_metric", "euclidean"),
+                       n_jobs=kwargs.get("n_jobs", -1))
+    return phenograph.cluster(x, **kwargs)
+
+
 def phenograph_clustering(data: pd.DataFrame,
                           features: list,
                           verbose: bool,
                           global_clustering: bool = False,
+                          precompute_knn: bool = False,
                           **kwargs):
     """
     Perform high-dimensional clustering of single cell data using the popular
@@ -134,6 +187,11 @@ def phenograph_clustering(data: pd.DataFrame,
     global_clustering: bool (default=False)
         Whether to cluster the whole dataframe or group on 'sample_id' and cluster
         groups
+    precompute_knn: bool (default=False)
+        If True, the k-nearest neighbour graph is built with Scikit-Learn's NearestNeighbors
+        (using the 'k', 'primary_metric' and 'n_jobs' keyword arguments) and passed to PhenoGraph
+        as a sparse graph. Tip: to cluster on an existing embedding, include the embedding
+        columns as features
     kwargs:
         Additional keyword arguments passed when calling phenograph.cluster
 
@@ -146,14 +204,14 @@ def phenograph_clustering(data: pd.DataFrame,
     _print = vprint(verbose=verbose)
     data["cluster_id"] = None
     if global_clustering:
-        communities, graph, q = phenograph.cluster(data[features], **kwargs)
+        communities, graph, q = _phenograph(data[features].to_numpy(dtype=np.float32), precompute_knn, **kwargs)
         data["cluster_id"] = communities
         return data, graph, q
     graphs = dict()
     q = dict()
     for _id, df in data.groupby("sample_id"):
         _print(f"----- Clustering {_id} -----")
-        communities, graph, q_ = phenograph.cluster(df[features], **kwargs)
+        communities, graph, q_ = _phenograph(df[features].to_numpy(dtype=np.float32), precompute_knn, **kwargs)
         graphs[_id], q[_id] = graph, q_
         df["cluster_id"] = communities
         data.loc[df.index, ["cluster_id"]] = df.cluster_id
@@ -520,15 +578,86 @@ def flowsom_clustering(data: pd.DataFrame,
     return data, None, None
 
 
+def _load_sample(fg: FileGroup,
+                 population: str,
+                 subject_ids: dict,
+                 transform: str = "logicle") -> pd.DataFrame:
+    """
+    Load the Population of a single FileGroup, labelled with the sample ID
+    and subject ID.
+
+    Parameters
+    ----------
+    fg: FileGroup
+    population: str
+    subject_ids: dict
+        {FileGroup ID: Subject ID}, as generated by _subject_ids_by_file
+    transform: str
+
+    Returns
+    -------
+    Pandas.DataFrame
+    """
+    pop = fg.load_population_df(population=population,
+                                transform=transform,
+                                label_downstream_affiliations=True)
+    pop.insert(0, "original_index", pop.index.to_numpy())
+    pop.reset_index(drop=True, inplace=True)
+    pop["sample_id"] = fg.primary_id
+    pop["subject_id"] = subject_ids.get(fg.id)
+    return pop
+
+
+def _concat_samples(frames: list) -> pd.DataFrame:
+    """
+    Concatenate per-sample dataframes sharing the same columns. Numeric columns
+    with the same dtype in every dataframe are filled into a preallocated array,
+    rather than going through pd.concat; all other columns, and dataframes
+    whose columns differ, are concatenated with pd.concat. The result matches
+    pd.concat(frames, ignore_index=True).
+
+    Parameters
+    ----------
+    frames: list
+        List of Pandas.DataFrame
+
+    Returns
+    -------
+    Pandas.DataFrame
+    """
+    columns = frames[0].columns
+    if not all(f.columns.equals(columns) for f in frames[1:]):
+        return pd.concat(frames, ignore_index=True)
+    offsets = np.cumsum([0] + [f.shape[0] for f in frames])
+    data = dict()
+    # Columns are addressed by position, so duplicate column names are supported
+    for i in range(len(columns)):
+        series = [f.iloc[:, i] for f in frames]
+        dtype = series[0].dtype
+        if isinstance(dtype, np.dtype) and dtype.kind in "biuf" and all(s.dtype == dtype for s in series):
+            buffer = np.empty(offsets[-1], dtype=dtype)
+            for s, start, end in zip(series, offsets[:-1], offsets[1:]):
+                buffer[start:end] = s.to_numpy()
+            data[i] = buffer
+        else:
+            # Concatenate as single column frames; dtypes are then resolved exactly as pd.concat(frames)
+            data[i] = pd.concat([f.iloc[:, [i]] for f in frames], ignore_index=True).iloc[:, 0]
+    data = pd.DataFrame(data, index=pd.RangeIndex(offsets[-1]), copy=False)
+    data.columns = columns
+    return data
+
+
 def _load_data(experiment: Experiment,
                population: str,
                transform: str = "logicle",
                sample_ids: list or None = None,
-               verbose: bool = True):
+               verbose: bool = True,
+               njobs: int = -1):
     """
     Load Population from samples in the given Experiment and generate a
     standard clustering dataframe that contains the columns 'sample_id',
-    'cluster_id' and 'meta_label'.
+    'cluster_id' and 'meta_label'. Samples are loaded concurrently in a
+    thread pool, as loading is bound by database and HDF5 access.
 
     Parameters
     ----------
@@ -537,26 +666,27 @@ def _load_data(experiment: Experiment,
     transform: str
     sample_ids: list, optional
     verbose: bool (default=True)
+    njobs: int (default=-1)
+        Number of threads to use for loading samples; if less than zero,
+        the number of available cores is used
 
     Returns
     -------
     Pandas.DataFrame
     """
     sample_ids = sample_ids or list(experiment.list_samples())
-    population_data = list()
-    for _id in progress_bar(sample_ids, verbose=verbose):
-        fg = experiment.get_sample(sample_id=_id)
-        pop = fg.load_population_df(population=population,
-                                    transform=transform,
-                                    label_downstream_affiliations=True)
-        pop["sample_id"] = _id
-        subject = _fetch_subject(fg)
-        if subject is not None:
-            subject = subject.subject_id
-        pop["subject_id"] = subject
-        population_data.append(pop)
-    data = pd.concat([df.reset_index().rename({"index": "original_index"}, axis=1)
-                      for df in population_data]).reset_index(drop=True)
+    filegroups = [experiment.get_sample(sample_id=_id) for _id in sample_ids]
+    if njobs < 0:
+        njobs = cpu_count()
+    load = partial(_load_sample,
+                   population=population,
+                   subject_ids=_subject_ids_by_file(filegroups),
+                   transform=transform)
+    with ThreadPool(max(1, min(njobs, len(filegroups)))) as pool:
+        population_data = list(progress_bar(pool.imap(load, filegroups),
+                                            verbose=verbose,
+                                            total=len(filegroups)))
+    data = _concat_samples(population_data)
     data["cluster_id"] = None
     data["meta_label"] = None
     return data
@@ -605,6 +735,9 @@ class Clustering:
         How to transform the data prior to clustering
     verbose: bool (default=True)
         Whether to provide output to stdout
+    njobs: int (default=-1)
+        Number of threads used to load samples; if less than zero, the number
+        of available cores is used
     """
     def __init__(self,
                  experiment: Experiment,
@@ -613,7 +746,8 @@ class Clustering:
                  sample_ids: list or None = None,
                  root_population: str = "root",
                  transform: str = "logicle",
-                 verbose: bool = True):
+                 verbose: bool = True,
+                 njobs: int = -1):
         self.experiment = experiment
         self.verbose = verbose
         self.print = vprint(verbose)
@@ -627,7 +761,9 @@ class Clustering:
         self.data = _load_data(experiment=experiment,
                                sample_ids=sample_ids,
                                transform=transform,
-                               population=root_population)
+                               population=root_population,
+                               verbose=verbose,
+                               njobs=njobs)
         self._load_clusters()
         self.print("Ready to cluster!")
 
@@ -641,16 +777,21 @@ class Clustering:
         None
         """
         self.print("Loading existing clusters...")
-        for sample_id in progress_bar(list(self.experiment.list_samples()), verbose=self.verbose):
+        sample_positions = self.data.groupby("sample_id", sort=False).indices
+        original_index = self.data.original_index.values
+        cluster_ids = self.data.cluster_id.to_numpy(dtype=object, copy=True)
+        meta_labels = self.data.meta_label.to_numpy(dtype=object, copy=True)
+        for sample_id, positions in progress_bar(sample_positions.items(), verbose=self.verbose):
             sample = self.experiment.get_sample(sample_id)
             pop = sample.get_population(self.root_population)
             for cluster in pop.clusters:
                 if cluster.tag != self.tag:
                     continue
-                idx = self.data[(self.data.sample_id == sample_id) &
-                                (self.data.original_index.isin(cluster.index))]
-                self.data.loc[idx, ["cluster_id"]] = cluster.cluster_id
-                self.data.loc[idx, ["meta_label"]] = cluster.meta_label
+                idx = positions[np.isin(original_index[positions], cluster.index)]
+                cluster_ids[idx] = cluster.cluster_id
+                meta_labels[idx] = cluster.meta_label
+        self.data["cluster_id"] = cluster_ids
+        self.data["meta_label"] = meta_labels
 
     def _check_null(self) -> list:
         """
@@ -805,14 +946,13 @@ class Clustering:
         -------
         None
         """
-        for sample_id in self.data.sample_id:
-            sample_df = self.data[self.data.sample_id == sample_id]
+        for sample_id, sample_df in self.data.groupby("sample_id"):
             fg = self.experiment.get_sample(sample_id)
             root = fg.get_population(self.root_population)
-            for cluster_id in sample_df.cluster_id:
-                idx = sample_df[sample_df.cluster_id == cluster_id].original_index.values
+            for cluster_id, cluster_df in sample_df.groupby("cluster_id"):
+                idx = cluster_df.original_index.values
                 root.add_cluster(Cluster(cluster_id=cluster_id,
-                                         meta_label=sample_df[sample_df.cluster_id == cluster_id].meta_label.values[0],
+                                         meta_label=cluster_df.meta_label.values[0],
                                          n=len(idx),
                                          index=idx,
                                          prop_of_events=len(idx) / sample_df.shape[0],
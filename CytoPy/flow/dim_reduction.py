@@ -81,7 +81,6 @@ def dimensionality_reduction(data: pd.DataFrame,
     (Pandas.DataFrame or Numpy.array) or (Pandas.DataFrame or Numpy.array, Reducer)
         Embeddings as numpy array or original DataFrame with new columns for embeddings
     """
-    data = data.copy()
     if method == 'UMAP':
         reducer = UMAP(random_state=42, n_components=n_components, **kwargs)
     elif method == 'PCA':
@@ -95,11 +94,12 @@ def dimensionality_reduction(data: pd.DataFrame,
     else:
         raise ValueError("Error: invalid method given for plot clusters, "
                          "must be one of: 'UMAP', 'tSNE', 'PCA', 'PHATE', 'KernelPCA'")
-    embeddings = reducer.fit_transform(data[features])
+    embeddings = reducer.fit_transform(data[features].to_numpy(dtype=np.float32))
     if return_embeddings_only:
         if return_reducer:
             return embeddings, reducer
         return embeddings
+    data = data.copy()
     for i, e in enumerate(embeddings.T):
         data[f'{method}{i+1}'] = e
     if return_reducer:
@@ -31,8 +31,8 @@ CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
 TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
-from ..data.subject import Subject, bugs, hmbpp_ribo, gram_status, biology
-from ..feedback import vprint, progress_bar
+from ..data.subject import Subject, bugs, hmbpp_ribo, gram_status, biology_summary
+from ..feedback import vprint
 from .dim_reduction import dimensionality_reduction
 from mongoengine.base.datastructures import EmbeddedDocumentList
 from sklearn.preprocessing import MinMaxScaler
@@ -42,7 +42,87 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 import numpy as np
+import hashlib
 import scprep
+import os
+
+# Scatter plots of more events than this are rasterized rather than drawn as vector markers
+RASTERIZE_THRESHOLD = 100000
+
+
+def _fetch_subjects(subject_ids: iter,
+                    *fields: str) -> dict:
+    """
+    Fetch the Subject documents for the given subject IDs in a single query, loading
+    only the requested fields.
+
+    Parameters
+    ----------
+    subject_ids: iterable
+        Subject IDs to fetch; null values are ignored
+    fields: str
+        Fields to load in addition to subject_id
+
+    Returns
+    -------
+    dict
+        {subject_id: Subject}
+    """
+    subject_ids = [x for x in subject_ids if x is not None]
+    subjects = Subject.objects(subject_id__in=subject_ids).only("subject_id", *fields).no_cache()
+    return {p.subject_id: p for p in subjects}
+
+
+def _is_discrete(labels: np.array) -> bool:
+    """
+    Infer whether plotting labels are discrete; labels are considered continuous
+    only if every value is a float. Checked against the array dtype, falling back
+    to an element-wise check for object arrays.
+
+    Parameters
+    ----------
+    labels: Numpy.Array
+
+    Returns
+    -------
+    bool
+    """
+    labels = np.asarray(labels)
+    if labels.size == 0:
+        return True
+    if labels.dtype != object:
+        return not np.issubdtype(labels.dtype, np.floating)
+    return not all(isinstance(x, float) for x in labels)
+
+
+def _embedding_cache_path(cache_dir: str,
+                          data: pd.DataFrame,
+                          features: list,
+                          method: str,
+                          n_components: int,
+                          kwargs: dict) -> str:
+    """
+    Generate the file path for cached embeddings, keyed by a hash of the dimensionality
+    reduction parameters and the contents of the feature space.
+
+    Parameters
+    ----------
+    cache_dir: str
+    data: Pandas.DataFrame
+    features: list
+    method: str
+    n_components: int
+    kwargs: dict
+        keyword arguments passed to the dim reduction algorithm
+
+    Returns
+    -------
+    str
+    """
+    key = hashlib.blake2b(digest_size=16)
+    key.update(repr((method, tuple(features), n_components, sorted(kwargs.items()))).encode())
+    key.update(pd.util.hash_pandas_object(data[features], index=True).values.tobytes())
+    return os.path.join(cache_dir, f"{method}_{key.hexdigest()}.npy")
 
 
 class Explorer:
@@ -64,12 +144,16 @@ class Explorer:
         Path to dataframe to load and visualise
     verbose: bool (default=True)
         Whether to provide feedback
+    cache_dir: str (optional)
+        If given, embeddings generated by dimensionality reduction are saved to this directory
+        and reloaded when the same method, features and data are requested again
     """
 
     def __init__(self,
                  data: pd.DataFrame or None = None,
                  path: str or None = None,
-                 verbose: bool = True):
+                 verbose: bool = True,
+                 cache_dir: str or None = None):
         assert data is not None or path is not None, "Must provide a Pandas DataFrame or path string to csv file"
         if data is None:
             self.data = pd.read_csv(path)
@@ -79,6 +163,9 @@ class Explorer:
                                                   "('subject_id') prior to initialising object"
         self.verbose = verbose
         self.print = vprint(verbose)
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
 
     def mask_data(self,
                   mask: pd.DataFrame) -> None:
@@ -95,6 +182,45 @@ class Explorer:
         """
         self.data = self.data[mask]
 
+    def downsample(self,
+                   sample_size: int,
+                   stratify_by: str or None = "subject_id",
+                   random_state: int or None = None) -> None:
+        """
+        Downsample the contained dataframe prior to dimensionality reduction or plotting.
+        If 'stratify_by' is given, an equal share of 'sample_size' is drawn from each group
+        (groups smaller than their share are kept in full).
+
+        Parameters
+        ----------
+        sample_size : int
+            Total number of events to keep
+        stratify_by : str, optional (default="subject_id")
+            Column to stratify sampling by
+        random_state : int, optional
+            Seed for the random number generator
+
+        Returns
+        -------
+        None
+        """
+        if sample_size >= self.data.shape[0]:
+            warn(f"Requested sample size {sample_size} is not smaller than the number of observations, "
+                 f"data will not be downsampled (n={self.data.shape[0]})")
+            return
+        rng = np.random.default_rng(random_state)
+        if stratify_by is None:
+            positions = rng.choice(self.data.shape[0], size=sample_size, replace=False)
+        else:
+            groups = self.data.groupby(stratify_by, sort=False, dropna=False).indices
+            n = max(1, sample_size // len(groups))
+            positions = np.concatenate([idx if len(idx) <= n else rng.choice(idx, size=n, replace=False)
+                                        for idx in groups.values()])
+            if positions.shape[0] > sample_size:
+                # More groups than sample_size; keep a random subset of the per-group samples
+                positions = rng.choice(positions, size=sample_size, replace=False)
+        self.data = self.data.take(np.sort(positions))
+
     def save(self,
              path: str) -> None:
         """
@@ -126,19 +252,16 @@ class Explorer:
         -------
         None
         """
-        self.data[variable] = None
-        for _id in progress_bar(self.data.subject_id.unique(),
-                                verbose=self.verbose):
-            if _id is None:
-                continue
-            p = Subject.objects(subject_id=_id).get()
+        subjects = _fetch_subjects(self.data.subject_id.unique(), variable)
+        values = dict()
+        for _id, p in subjects.items():
             try:
                 assert type(p[variable]) != EmbeddedDocumentList, \
                     'Chosen variable is an embedded document.'
-                self.data.loc[self.data.subject_id == _id, variable] = p[variable]
+                values[_id] = p[variable]
             except KeyError:
                 warn(f'{_id} is missing meta-variable {variable}')
-                self.data.loc[self.data.subject_id == _id, variable] = None
+        self.data[variable] = self.data.subject_id.map(values)
 
     def load_infectious_data(self,
                              multi_org: str = 'list'):
@@ -164,23 +287,18 @@ class Explorer:
         -------
         None
         """
-        self.data['organism_name'] = 'Unknown'
-        self.data['gram_status'] = 'Unknown'
-        self.data['organism_name_short'] = 'Unknown'
-        self.data['hmbpp'] = 'Unknown'
-        self.data['ribo'] = 'Unknown'
-
-        for subject_id in progress_bar(self.data.subject_id.unique()):
-            if subject_id is None:
-                continue
-            p = Subject.objects(subject_id=subject_id).get()
-            self.data.loc[self.data.subject_id == subject_id, 'organism_name'] = bugs(subject=p, multi_org=multi_org)
-            self.data.loc[self.data.subject_id == subject_id, 'organism_name_short'] = bugs(subject=p,
-                                                                                            multi_org=multi_org,
-                                                                                            short_name=True)
-            self.data.loc[self.data.subject_id == subject_id, 'hmbpp'] = hmbpp_ribo(subject=p, field='hmbpp_status')
-            self.data.loc[self.data.subject_id == subject_id, 'ribo'] = hmbpp_ribo(subject=p, field='ribo_status')
-            self.data.loc[self.data.subject_id == subject_id, 'gram_status'] = gram_status(subject=p)
+        subjects = _fetch_subjects(self.data.subject_id.unique(), "infection_data")
+        summaries = {"organism_name": lambda p: bugs(subject=p, multi_org=multi_org),
+                     "organism_name_short": lambda p: bugs(subject=p, multi_org=multi_org, short_name=True),
+                     "hmbpp": lambda p: hmbpp_ribo(subject=p, field='hmbpp_status'),
+                     "ribo": lambda p: hmbpp_ribo(subject=p, field='ribo_status'),
+                     "gram_status": lambda p: gram_status(subject=p)}
+        columns = pd.DataFrame({column: self.data.subject_id.map({subject_id: func(p)
+                                                                  for subject_id, p in subjects.items()})
+                               for column, func in summaries.items()},
+                               index=self.data.index).fillna('Unknown')
+        # Add all columns in one concatenation rather than fragmenting the frame with repeated inserts
+        self.data = pd.concat([self.data.drop(columns=columns.columns, errors="ignore"), columns], axis=1)
 
     def load_biology_data(self,
                           test_name: str,
@@ -205,7 +323,10 @@ class Explorer:
         -------
         None
         """
-        self.data[test_name] = self.data['subject_id'].apply(lambda x: biology(x, test_name, summary_method))
+        subjects = _fetch_subjects(self.data.subject_id.unique(), "patient_biology")
+        values = {subject_id: biology_summary(subject=p, test_name=test_name, method=summary_method)
+                  for subject_id, p in subjects.items()}
+        self.data[test_name] = self.data.subject_id.map(values)
 
     def dimenionality_reduction(self,
                                 method: str,
@@ -238,19 +359,30 @@ class Explorer:
         if all([x in self.data.columns for x in embedding_cols]) and not overwrite:
             warn(f'Embeddings for {method} already exist, change arg "overwrite" to True to overwrite existing')
             return
-        self.data = dimensionality_reduction(self.data,
-                                             features,
-                                             method,
-                                             n_components,
-                                             return_embeddings_only=False,
-                                             return_reducer=False,
-                                             **kwargs)
+        cache_path = None
+        if self.cache_dir is not None:
+            cache_path = _embedding_cache_path(self.cache_dir, self.data, features, method, n_components, kwargs)
+        if cache_path is not None and os.path.isfile(cache_path):
+            self.print(f"Loading cached {method} embeddings")
+            embeddings = np.load(cache_path)
+        else:
+            embeddings = dimensionality_reduction(self.data,
+                                                  features,
+                                                  method,
+                                                  n_components,
+                                                  return_embeddings_only=True,
+                                                  return_reducer=False,
+                                                  **kwargs)
+            if cache_path is not None:
+                np.save(cache_path, embeddings)
+        for i, col in enumerate(embedding_cols):
+            self.data[col] = embeddings[:, i]
 
     def _plotting_labels(self,
                          label: str,
-                         populations: list or None) -> list:
+                         populations: list or None) -> np.array:
         """
-        Generates a list of values to be used for colouring data points in plot
+        Generates an array of values to be used for colouring data points in plot
 
         Parameters
         ----------
@@ -261,20 +393,19 @@ class Explorer:
             list of labels is filtered to contain only populations in this list
         Returns
         -------
-        List
-            list of labels
+        Numpy.Array
+            array of labels
         """
-        if label == 'population_label':
-            if populations is None:
-                return self.data[label].values
-            return list(map(lambda x: x if x in populations else 'None', self.data['population_label'].values))
-        else:
-            return list(self.data[label].values)
+        labels = self.data[label]
+        if label == 'population_label' and populations is not None:
+            # Hashed membership test; np.isin would sort the object array
+            labels = labels.where(labels.isin(populations), 'None')
+        return labels.to_numpy()
 
     def scatter_plot(self,
                      label: str,
                      features: list,
-                     discrete: bool,
+                     discrete: bool or None = None,
                      populations: list or None = None,
                      n_components: int = 2,
                      dim_reduction_method: str = 'UMAP',
@@ -296,9 +427,10 @@ class Explorer:
             (check valid column names using Explorer.data.columns)
         features : list
             list of column names used as feature space for dimensionality reduction
-        discrete : bool
+        discrete : bool, optional
             Are the labels for this plot discrete or continuous? If True, labels will be treated as
             discrete, otherwise labels will be coloured using a gradient and a colourbar will be provided.
+            If not given, labels are treated as continuous only if they are floating point values.
         populations : list, optional
             if label has value of 'population_label', only populations in this
             list will be included (events with no population associated will be labelled 'None')
@@ -316,7 +448,8 @@ class Explorer:
         dim_reduction_kwargs : dict, optional
             additional keyword arguments to pass to dimensionality reduction algorithm
         matplotlib_kwargs : dict, optional
-            additional keyword arguments to pass to matplotlib call
+            additional keyword arguments to pass to matplotlib call; scatters with more events
+            than RASTERIZE_THRESHOLD are rasterized unless 'rasterized' is given
         Returns
         -------
         matplotlib.axes
@@ -335,10 +468,14 @@ class Explorer:
         assert label in self.data.columns, f'{label} is not a valid entry, valid labels include: ' \
                                            f'{self.data.columns.tolist()}'
         plabel = self._plotting_labels(label, populations)
-        data = self.data.copy()
+        data = self.data
         if mask is not None:
+            mask = np.asarray(mask, dtype=bool)
             data = data[mask]
-            plabel = np.array(plabel)[data.index.values]
+            plabel = plabel[mask]
+        if discrete is None:
+            discrete = _is_discrete(plabel)
+        matplotlib_kwargs.setdefault("rasterized", data.shape[0] > RASTERIZE_THRESHOLD)
 
         size = 10
         if label == "cluster_id" or label == "meta_label":
@@ -409,14 +546,13 @@ class Explorer:
         -------
         matplotlib.axes
         """
-        d = self.data.copy()
+        d = self.data[features + [heatmap_var]]
         if mask is not None:
             d = d[mask]
-        d = d[features + [heatmap_var]]
-        d[features] = d[features].apply(pd.to_numeric)
+        d = d.astype({f: np.float32 for f in features})
         if normalise:
             d[features] = MinMaxScaler().fit_transform(d[features])
-        d = d.groupby(by=heatmap_var)[features].apply(summary_func)
+        d = d.groupby(by=heatmap_var, observed=True)[features].agg(summary_func)
         if clustermap:
             ax = sns.clustermap(d, col_cluster=col_cluster, cmap='viridis', figsize=figsize, **kwargs)
             return ax
@@ -454,7 +590,7 @@ class Explorer:
         -------
         matplotlib.axes
         """
-        d = self.data.copy()
+        d = self.data
         if mask is not None:
             d = self.data[mask]
         assert x_variable in ["cluster_id", "meta_label", "population_label"], f'x_variable must be one of' \
@@ -469,10 +605,12 @@ class Explorer:
             ax.set_xlabel(x_variable)
             return ax
         if y_variable in d.columns and discrete:
-            x = (d[[x_variable, y_variable]].groupby(x_variable)[y_variable]
-                 .value_counts(normalize=True)
-                 .rename('percentage')
+            x = (pd.crosstab(d[x_variable].astype("category"),
+                             d[y_variable].astype("category"),
+                             normalize="index")
                  .mul(100)
+                 .stack()
+                 .rename('percentage')
                  .reset_index()
                  .sort_values(y_variable))
             fig, ax = plt.subplots(figsize=figsize)
@@ -483,7 +621,8 @@ class Explorer:
             return ax
         if y_variable in d.columns and not discrete:
             fig, ax = plt.subplots(figsize=figsize)
-            d = d.sample(10000)
+            idx = np.random.default_rng().choice(d.shape[0], size=min(10000, d.shape[0]), replace=False)
+            d = d[[x_variable, y_variable]].take(idx)
             ax = sns.swarmplot(x=x_variable, y=y_variable, data=d, ax=ax, s=3, **kwargs)
             return ax
 
@@ -552,7 +691,8 @@ class Explorer:
         else:
             ax.hist2d(d[x], d[y], bins=500, norm=LogNorm(), label=primary_id['value'])
         if d2 is not None:
-            ax.scatter(d2[x], d2[y], marker='o', s=1, c='r', alpha=0.8, label=secondary_id['value'])
+            ax.scatter(d2[x], d2[y], marker='o', s=1, c='r', alpha=0.8, label=secondary_id['value'],
+                       rasterized=d2.shape[0] > RASTERIZE_THRESHOLD)
 
         if xlim:
             ax.set_xlim(xlim)
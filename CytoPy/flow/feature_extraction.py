@@ -70,6 +70,26 @@ def _fetch_subject(filegroup: FileGroup):
     return subject
 
 
+def _subject_ids_by_file(filegroups: list) -> dict:
+    """
+    Reverse search for the Subject IDs of many FileGroups in a single query
+
+    Parameters
+    ----------
+    filegroups: list
+        List of FileGroup
+
+    Returns
+    -------
+    dict
+        {FileGroup ID: Subject ID}; FileGroups without an associated Subject are omitted
+    """
+    file_ids = [fg.id for fg in filegroups]
+    subjects = Subject.objects(files__in=file_ids).only("subject_id", "files").as_pymongo()
+    file_ids = set(file_ids)
+    return {f: s["subject_id"] for s in subjects for f in s.get("files", []) if f in file_ids}
+
+
 def _fetch_subject_meta(sample_id: str,
                         experiment: Experiment,
                         meta_label: str):
@@ -150,14 +170,13 @@ def experiment_statistics(experiment: Experiment,
     Pandas.DataFrame
     """
     data = list()
-    for sample_id in experiment.list_samples():
-        fg = experiment.get_sample(sample_id)
+    filegroups = [f for f in experiment.fcs_files if f.valid]
+    subject_ids = _subject_ids_by_file(filegroups) if include_subject_id else {}
+    for fg in filegroups:
         df = population_stats(fg)
-        df["sample_id"] = sample_id
-        if include_subject_id:
-            subject = _fetch_subject(filegroup=fg)
-            if subject is not None:
-                df["subject_id"] = subject.subject_id
+        df["sample_id"] = fg.primary_id
+        if fg.id in subject_ids:
+            df["subject_id"] = subject_ids[fg.id]
         data.append(df)
     return pd.concat(data)
 
@@ -211,8 +230,9 @@ def cluster_statistics(experiment: Experiment,
     Pandas.DataFrame
     """
     all_cluster_data = list()
-    for sample_id in experiment.list_samples():
-        fg = experiment.get_sample(sample_id)
+    filegroups = [f for f in experiment.fcs_files if f.valid]
+    subject_ids = _subject_ids_by_file(filegroups) if include_subject_id else {}
+    for fg in filegroups:
         if population is not None:
             data = _population_cluster_statistics(pop=fg.get_population(population_name=population),
                                                   meta_label=meta_label,
@@ -226,10 +246,8 @@ def cluster_statistics(experiment: Experiment,
                 data.append(df)
             data = pd.concat(data)
         data["sample_id"] = fg.primary_id
-        if include_subject_id:
-            subject = _fetch_subject(filegroup=fg)
-            if subject is not None:
-                data["subject_id"] = subject.subject_id
+        if fg.id in subject_ids:
+            data["subject_id"] = subject_ids[fg.id]
         all_cluster_data.append(data)
     return pd.concat(all_cluster_data)
 
@@ -28,6 +28,7 @@ SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 from CytoPy.data.fcs import FileGroup
 from sklearn.utils.class_weight import compute_class_weight
 from sklearn import metrics as skmetrics
+from scipy.sparse import csr_matrix
 from xgboost import XGBClassifier
 from sklearn.discriminant_analysis import *
 from sklearn.neighbors import *
@@ -36,6 +37,7 @@ from sklearn.svm import *
 from keras.models import Sequential
 import matplotlib.pyplot as plt
 import pandas as pd
+from functools import lru_cache
 import numpy as np
 import inspect
 
@@ -49,10 +51,53 @@ __email__ = "burtonrj@cardiff.ac.uk"
 __status__ = "Production"
 
 
+# Classes available to build_sklearn_model and build_keras_model, collected once at import
+_CLASS_REGISTRY = {k: v for k, v in globals().items() if inspect.isclass(v)}
+
+
+def register_class(cls: type,
+                   name: str or None = None) -> None:
+    """
+    Make a class available to build_sklearn_model and build_keras_model by name
+    (e.g. a Keras layer or a classifier from another library)
+
+    Parameters
+    ----------
+    cls: type
+    name: str, optional
+        Name to register the class under; defaults to the class name
+
+    Returns
+    -------
+    None
+    """
+    assert inspect.isclass(cls), "Only classes can be registered"
+    _CLASS_REGISTRY[name or cls.__name__] = cls
+
+
+def _lookup_class(klass: str,
+                  error_message: str):
+    """
+    Find a class by name in the class registry, raising an AssertionError with
+    the given message if no such class has been registered.
+
+    Parameters
+    ----------
+    klass: str
+    error_message: str
+
+    Returns
+    -------
+    type
+    """
+    assert klass in _CLASS_REGISTRY, error_message
+    return _CLASS_REGISTRY[klass]
+
+
 def build_sklearn_model(klass: str,
                         **params):
     """
-    Initiate a SklearnClassifier object using Classes in the global environment
+    Initiate a SklearnClassifier object using Classes in the class registry
 
     Parameters
     ----------
@@ -62,10 +107,11 @@ def build_sklearn_model(klass: str,
     -------
     object
     """
-    assert klass in globals().keys(), \
-        f"Module {klass} not found, is this a Scikit-Learn (or like) classifier? It might " \
-        f"not currently be supported. See the docs for details."
-    return globals()[klass](**params)
+    cls = _lookup_class(klass,
+                        f"Module {klass} not found, is this a Scikit-Learn (or like) classifier? It might "
+                        f"not currently be supported; other classes can be made available with "
+                        f"register_class. See the docs for details.")
+    return cls(**params)
 
 
 def build_keras_model(layers: list,
@@ -91,14 +137,12 @@ def build_keras_model(layers: list,
     -------
     object
     """
-    required_imports = [x.klass for x in layers]
-    for i in required_imports:
-        assert i in globals().keys(), f"Module {i} not found, have you imported it into " \
-                                      f"the working environment?"
+    layer_classes = [_lookup_class(x.klass,
+                                   f"Module {x.klass} not found, have you registered it with register_class?")
+                     for x in layers]
     model = Sequential()
-    for layer in layers:
-        keras_klass = globals()[layer.klass](**layer.kwargs)
-        model.add(keras_klass)
+    for layer, cls in zip(layers, layer_classes):
+        model.add(cls(**layer.kwargs))
     model.compile(optimizer=optimizer,
                   loss=loss,
                   metrics=metrics,
@@ -106,6 +150,111 @@ def build_keras_model(layers: list,
     return model
 
 
+# F1 metrics are named by prefix and averaging method e.g. "f1_macro"
+F1_PREFIX = "f1_"
+
+
+def _f1_scorer(average: str):
+    def scorer(y_true, y_pred, y_score):
+        assert y_pred is not None, "For F1 score predictions must be provided;`y_pred` is None"
+        return skmetrics.f1_score(y_true=y_true, y_pred=y_pred, average=average)
+    return scorer
+
+
+def _roc_auc_scorer(y_true, y_pred, y_score):
+    return skmetrics.roc_auc_score(y_true=y_true,
+                                   y_score=y_score,
+                                   multi_class="ovo",
+                                   average="macro")
+
+
+def _score_scorer(name: str, f):
+    def scorer(y_true, y_pred, y_score):
+        assert y_score is not None, f"Metric requested ({name}) requires probabilities of positive class but " \
+                                    f"y_score not provided; y_score is None."
+        return f(y_true=y_true, y_score=y_score)
+    return scorer
+
+
+def _pred_scorer(f):
+    def scorer(y_true, y_pred, y_score):
+        return f(y_true=y_true, y_pred=y_pred)
+    return scorer
+
+
+@lru_cache(maxsize=None)
+def _metric_scorer(name: str):
+    """
+    Build a function computing the named metric from (y_true, y_pred, y_score), with the
+    arguments wired according to the metric. Cached, so the metric is looked up and its
+    signature inspected only once per name.
+
+    Parameters
+    ----------
+    name: str
+
+    Returns
+    -------
+    callable
+    """
+    if name.startswith(F1_PREFIX):
+        return _f1_scorer(name[len(F1_PREFIX):])
+    if name == "roc_auc_score":
+        return _roc_auc_scorer
+    f = getattr(skmetrics, name)
+    params = inspect.signature(f).parameters
+    if "y_score" in params:
+        return _score_scorer(name, f)
+    if "y_pred" in params:
+        return _pred_scorer(f)
+    raise ValueError("Unexpected metric. Signature should contain either 'y_score' or 'y_pred'")
+
+
+# Metrics that can be derived from a single confusion matrix of (single label) predictions
+CONFUSION_METRICS = ["f1_macro", "f1_micro", "f1_weighted", "accuracy_score", "balanced_accuracy_score"]
+
+
+def _confusion_metrics(metrics: list,
+                       y_true: np.array,
+                       y_pred: np.array) -> dict:
+    """
+    Compute metrics from CONFUSION_METRICS using one confusion matrix, rather than have each
+    Scikit-Learn metric function count true/false positives independently.
+
+    Parameters
+    ----------
+    metrics: list
+        Metric names, each a member of CONFUSION_METRICS
+    y_true: Numpy.Array
+        True labels, shape (n_samples,)
+    y_pred: Numpy.Array
+        Estimated targets, shape (n_samples,)
+
+    Returns
+    -------
+    dict
+        Dictionary of performance metrics
+    """
+    cm = skmetrics.confusion_matrix(y_true, y_pred)
+    tp = np.diag(cm)
+    fp = cm.sum(axis=0) - tp
+    fn = cm.sum(axis=1) - tp
+    support = cm.sum(axis=1)
+    f1 = 2 * tp / (2 * tp + fp + fn)
+    results = dict()
+    for m in metrics:
+        if m == "f1_macro":
+            results[m] = f1.mean()
+        elif m == "f1_weighted":
+            results[m] = np.average(f1, weights=support)
+        elif m in ["f1_micro", "accuracy_score"]:
+            results[m] = tp.sum() / cm.sum()
+        elif m == "balanced_accuracy_score":
+            # Classes only present in predictions do not contribute, as in Scikit-Learn
+            results[m] = (tp[support > 0] / support[support > 0]).mean()
+    return results
+
+
 def calc_metrics(metrics: list,
                  y_true: np.array,
                  y_pred: np.array or None = None,
@@ -138,29 +287,16 @@ def calc_metrics(metrics: list,
     dict
         Dictionary of performance metrics
     """
+    precomputed = dict()
+    confusion_metrics = [m for m in metrics if m in CONFUSION_METRICS]
+    if len(confusion_metrics) >= 2 and y_pred is not None and np.ndim(y_true) == 1:
+        precomputed = _confusion_metrics(confusion_metrics, y_true=y_true, y_pred=y_pred)
     results = dict()
     for m in metrics:
-        if "f1" in m:
-            avg = m.split("_")[1]
-            f = getattr(skmetrics, "f1_score")
-            assert y_pred is not None, "For F1 score predictions must be provided;`y_pred` is None"
-            results[m] = f(y_true=y_true, y_pred=y_pred, average=avg)
-        elif m == "roc_auc_score":
-            f = getattr(skmetrics, m)
-            results[m] = f(y_true=y_true,
-                           y_score=y_score,
-                           multi_class="ovo",
-                           average="macro")
+        if m in precomputed:
+            results[m] = precomputed[m]
         else:
-            f = getattr(skmetrics, m)
-            if "y_score" in inspect.signature(f).parameters.keys():
-                assert y_score is not None, f"Metric requested ({m}) requires probabilities of positive class but " \
-                                            f"y_score not provided; y_score is None."
-                results[m] = f(y_true=y_true, y_score=y_score)
-            elif "y_pred" in inspect.signature(f).parameters.keys():
-                results[m] = f(y_true=y_true, y_pred=y_pred)
-            else:
-                raise ValueError("Unexpected metric. Signature should contain either 'y_score' or 'y_pred'")
+            results[m] = _metric_scorer(m)(y_true, y_pred, y_score)
     return results
 
 
@@ -191,7 +327,7 @@ def confusion_matrix_plots(classifier,
     figsize: tuple (default=(10,5))
         Size of the figure
     kwargs:
-        Additional keyword arguments passed to sklearn.metrics.plot_confusion_matrix
+        Additional keyword arguments passed to sklearn.metrics.ConfusionMatrixDisplay.plot
 
     Returns
     -------
@@ -199,16 +335,15 @@ def confusion_matrix_plots(classifier,
     """
     cmap = cmap or plt.cm.Blues
     fig, axes = plt.subplots(2, figsize=figsize)
+    # Predict and count once; the normalised matrix is derived from the raw counts
+    cm = skmetrics.confusion_matrix(y, classifier.predict(x))
+    with np.errstate(all="ignore"):
+        norm_cm = np.nan_to_num(cm / cm.sum(axis=1, keepdims=True))
     titles = ["Confusion matrix, without normalisation", "Confusion matrix; normalised"]
-    for i, (title, norm) in enumerate(zip(titles, [False, True])):
-        skmetrics.plot_confusion_matrix(estimator=classifier,
-                                        X=x,
-                                        y=y,
-                                        display_labels=class_labels,
-                                        cmap=cmap,
-                                        normalize=norm,
-                                        ax=axes[i],
-                                        **kwargs)
+    for i, (title, matrix) in enumerate(zip(titles, [cm, norm_cm])):
+        disp = skmetrics.ConfusionMatrixDisplay(confusion_matrix=matrix,
+                                                display_labels=class_labels)
+        disp.plot(cmap=cmap, ax=axes[i], **kwargs)
         axes[i].set_title(title)
     return fig
 
@@ -229,8 +364,8 @@ def assert_population_labels(ref: FileGroup,
     List
     """
     assert len(ref.populations) >= 2, "Reference sample does not contain any gated populations"
-    for x in expected_labels:
-        assert x in ref.tree.keys(), f"Ref FileGroup missing expected population {x}"
+    missing = set(expected_labels) - set(ref.tree.keys())
+    assert not missing, f"Ref FileGroup missing expected populations {missing}"
 
 
 def check_downstream_populations(ref: FileGroup,
@@ -250,18 +385,86 @@ def check_downstream_populations(ref: FileGroup,
     -------
     None
     """
-    downstream = ref.list_downstream_populations(root_population)
-    assert all([x in downstream for x in population_labels]), \
+    downstream = frozenset(ref.list_downstream_populations(root_population))
+    missing = [x for x in population_labels if x not in downstream]
+    assert not missing, \
         "The first population in population_labels should be the 'root' population, with all further populations " \
         "being downstream from this 'root'. The given population_labels has one or more populations that is not " \
-        "downstream from the given root."
+        f"downstream from the given root: {missing}"
+
+
+def _index_positions(data: pd.DataFrame,
+                     idx: np.ndarray) -> np.ndarray:
+    """
+    Integer positions of the given index labels within a DataFrame; labels that are
+    not present in the DataFrame are dropped.
+
+    Parameters
+    ----------
+    data: Pandas.DataFrame
+    idx: Numpy.Array
+
+    Returns
+    -------
+    Numpy.Array
+    """
+    positions = data.index.get_indexer(idx)
+    return positions[positions >= 0]
+
+
+def _population_indexes(ref: FileGroup,
+                        population_labels: list) -> dict:
+    """
+    Index of each of the given populations, collected in a single pass over the
+    populations of the FileGroup.
+
+    Parameters
+    ----------
+    ref: FileGroup
+    population_labels: list
+
+    Returns
+    -------
+    dict
+        {population name: index}
+    """
+    populations = {p.population_name: p for p in ref.populations}
+    for pop in population_labels:
+        assert pop in populations, f'Population {pop} does not exist'
+    return {pop: populations[pop].index for pop in population_labels}
+
+
+def _feature_space(data: pd.DataFrame,
+                   features: list,
+                   as_numpy: bool,
+                   dtype: type) -> pd.DataFrame or np.ndarray:
+    """
+    Select the feature columns of a DataFrame, optionally as a contiguous Numpy.Array.
+
+    Parameters
+    ----------
+    data: Pandas.DataFrame
+    features: list
+    as_numpy: bool
+    dtype: type
+
+    Returns
+    -------
+    Pandas.DataFrame or Numpy.Array
+    """
+    if as_numpy:
+        return np.ascontiguousarray(data[features].to_numpy(dtype=dtype))
+    return data[features]
 
 
 def multilabel(ref: FileGroup,
                root_population: str,
                population_labels: list,
                transform: str,
-               features: list) -> (pd.DataFrame, pd.DataFrame):
+               features: list,
+               as_numpy: bool = False,
+               dtype: type = np.float32,
+               sparse: bool = False) -> (pd.DataFrame, pd.DataFrame):
     """
     Load the root population DataFrame from the reference FileGroup (assumed to be the first
     population in 'population_labels'). Then iterate over the remaining population creating a
@@ -273,25 +476,52 @@ def multilabel(ref: FileGroup,
     population_labels: list
     transform: str
     features: list
+    as_numpy: bool (default=False)
+        If True, return the feature space as a contiguous Numpy.Array rather than a DataFrame
+    dtype: type (default=Numpy.float32)
+        Data type of the feature space when as_numpy is True
+    sparse: bool (default=False)
+        If True, population affiliations are returned as a Scipy CSR matrix, with columns in
+        the order of population_labels, rather than a (uint8) DataFrame
 
     Returns
     -------
-    (Pandas.DataFrame, Pandas.DataFrame)
+    (Pandas.DataFrame or Numpy.Array, Pandas.DataFrame or scipy.sparse.csr_matrix)
         Root population flourescent intensity values, population affiliations (dummy matrix)
     """
     root = ref.load_population_df(population=root_population,
-                                  transform=transform)
-    for pop in population_labels:
-        root[pop] = 0
-        root.loc[ref.get_population(pop).index, pop] = 1
-    return root[features], root[population_labels]
+                                  transform=transform,
+                                  columns=features)
+    idx_map = _population_indexes(ref, population_labels)
+    shape = (root.shape[0], len(population_labels))
+    rows, columns = np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    if population_labels:
+        # Resolve all row positions in one call
+        sizes = [len(idx_map[pop]) for pop in population_labels]
+        rows = root.index.get_indexer(np.concatenate([idx_map[pop] for pop in population_labels]))
+        columns = np.repeat(np.arange(len(population_labels)), sizes)
+        found = rows >= 0
+        rows, columns = rows[found], columns[found]
+    x = _feature_space(root, features, as_numpy, dtype)
+    if sparse:
+        y = csr_matrix((np.ones(rows.size, dtype=np.uint8), (rows, columns)), shape=shape)
+        y.sum_duplicates()
+        y.data[:] = 1
+        return x, y
+    # Scatter every indicator in a single write
+    y = np.zeros(shape, dtype=np.uint8)
+    y[rows, columns] = 1
+    return x, pd.DataFrame(y, columns=population_labels, index=root.index)
 
 
 def singlelabel(ref: FileGroup,
                 root_population: str,
                 population_labels: list,
                 transform: str,
-                features: list) -> (pd.DataFrame, np.ndarray):
+                features: list,
+                as_numpy: bool = False,
+                dtype: type = np.float32,
+                categorical: bool = False) -> (pd.DataFrame, np.ndarray):
     """
     Load the root population DataFrame from the reference FileGroup (assumed to be the first
     population in 'population_labels'). Then iterate over the remaining population creating a
@@ -305,38 +535,73 @@ def singlelabel(ref: FileGroup,
     population_labels: list
     transform: str
     features: list
+    as_numpy: bool (default=False)
+        If True, return the feature space as a contiguous Numpy.Array rather than a DataFrame
+    dtype: type (default=Numpy.float32)
+        Data type of the feature space when as_numpy is True
+    categorical: bool (default=False)
+        If True, labels are returned as a Pandas.Categorical with categories root_population
+        followed by population_labels (without duplicates)
 
     Returns
     -------
-    (Pandas.DataFrame, Numpy.Array)
+    (Pandas.DataFrame or Numpy.Array, Numpy.Array or Pandas.Categorical)
         Root population flourescent intensity values, labels
     """
     root = ref.load_population_df(population=root_population,
-                                  transform=transform)
-    root["label"] = 0
+                                  transform=transform,
+                                  columns=features)
+    idx_map = _population_indexes(ref, population_labels)
+    y = np.zeros(root.shape[0], dtype=np.int32)
     for i, pop in enumerate(population_labels):
-        pop_idx = ref.get_population(population_name=pop).index
-        root.loc[pop_idx, "label"] = i + 1
-    y = root["label"].values
-    root.drop("label", axis=1, inplace=True)
-    return root[features], y
-
-
-def auto_weights(y: np.ndarray):
+        y[_index_positions(root, idx_map[pop])] = i + 1
+    if categorical:
+        # De-duplicate categories (e.g. root_population within population_labels), remapping codes to match
+        names = [root_population] + list(population_labels)
+        categories = list(dict.fromkeys(names))
+        codes = np.array([categories.index(n) for n in names], dtype=np.int32)
+        y = pd.Categorical.from_codes(codes[y], categories=categories)
+    return _feature_space(root, features, as_numpy, dtype), y
+
+
+def auto_weights(y: np.ndarray,
+                 classes: np.ndarray or None = None):
     """
     Estimate optimal weights from a list of class labels.
 
     Parameters
     ----------
     y: Numpy.Array
+    classes: Numpy.Array (optional)
+        Class labels, if already known e.g. 0 to P for the output of singlelabel; avoids
+        having to find the unique values of y. Every class should be present in y.
 
     Returns
     -------
     dict
         Dictionary of class weights {label: weight}
     """
-    classes = np.unique(y)
-    weights = compute_class_weight('balanced',
-                                   classes=classes,
-                                   y=y)
+    y = np.asarray(y)
+    integer_coded = y.dtype.kind in "iu" and y.size > 0 and y.min() >= 0
+    if classes is not None:
+        classes = np.asarray(classes)
+        if integer_coded and np.array_equal(classes, np.arange(classes.size)) and y.max() < classes.size:
+            counts = np.bincount(y, minlength=classes.size)
+            assert (counts > 0).all(), "Every class should be present in y"
+            weights = y.size / (classes.size * counts)
+        else:
+            assert np.isin(classes, y).all(), "Every class should be present in y"
+            weights = compute_class_weight('balanced',
+                                           classes=classes,
+                                           y=y)
+    elif integer_coded:
+        # Balanced weights, n_samples / (n_classes * class count), from a single counting pass
+        counts = np.bincount(y)
+        classes = np.nonzero(counts)[0]
+        weights = y.size / (classes.size * counts[classes])
+    else:
+        classes = np.unique(y)
+        weights = compute_class_weight('balanced',
+                                       classes=classes,
+                                       y=y)
     return {i: w for i, w in enumerate(weights)}
@@ -616,7 +616,7 @@ class SimilarityMatrix:
         -------
         Pandas.DataFrame
         """
-        distance_df = pd.DataFrame()
+        frames = list()
         for s in progress_bar(self.data.keys(), verbose=self.verbose):
             distances = self._calc_divergence(target_id=s,
                                               distance_metric=distance_metric)
@@ -625,8 +625,11 @@ class SimilarityMatrix:
                 name_distances[n].append(d)
             name_distances = pd.DataFrame(name_distances)
             name_distances["sample_id"] = s
-            distance_df = pd.concat([distance_df, name_distances])
-        return distance_df
+            frames.append(name_distances)
+        # Concatenate once rather than per sample to avoid re-copying the accumulated frame
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, sort=False)
 
     def matrix(self,
                distance_metric: str or callable = 'jsd',
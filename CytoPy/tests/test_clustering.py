@@ -0,0 +1,35 @@
+from CytoPy.flow.clustering.main import _concat_samples
+import pandas as pd
+import numpy as np
+
+
+def example_frame(sample_id: str, n: int, x_dtype: type = np.float64):
+    return pd.DataFrame({"x": np.random.normal(0, 1, n).astype(x_dtype),
+                         "cluster_id": np.random.randint(0, 5, n),
+                         "sample_id": [sample_id] * n,
+                         "meta_label": pd.Categorical(np.random.choice(["a", "b"], n)),
+                         "gated": np.random.uniform(0, 1, n) > 0.5},
+                        index=np.random.choice(1000, n, replace=False))
+
+
+def test_concat_samples():
+    frames = [example_frame("s1", 100), example_frame("s2", 50), example_frame("s3", 0)]
+    pd.testing.assert_frame_equal(_concat_samples(frames), pd.concat(frames, ignore_index=True))
+
+
+def test_concat_samples_mixed_dtypes():
+    frames = [example_frame("s1", 100), example_frame("s2", 50, x_dtype=np.float32)]
+    frames[1]["cluster_id"] = frames[1]["cluster_id"].astype(np.float64)
+    frames[1]["gated"] = frames[1]["gated"].astype(np.int64)
+    pd.testing.assert_frame_equal(_concat_samples(frames), pd.concat(frames, ignore_index=True))
+
+
+def test_concat_samples_duplicate_columns():
+    frames = [pd.DataFrame([[1., "a", 2]], columns=["x", "y", "x"]),
+              pd.DataFrame([[3., "b", 4]], columns=["x", "y", "x"])]
+    pd.testing.assert_frame_equal(_concat_samples(frames), pd.concat(frames, ignore_index=True))
+
+
+def test_concat_samples_different_columns():
+    frames = [example_frame("s1", 10), example_frame("s2", 10).drop(columns=["gated"])]
+    pd.testing.assert_frame_equal(_concat_samples(frames), pd.concat(frames, ignore_index=True))
@@ -0,0 +1,66 @@
+from CytoPy.flow import explore
+from CytoPy.flow.explore import Explorer
+import pandas as pd
+import numpy as np
+import pytest
+
+
+def example_data(n: int = 1000):
+    data = pd.DataFrame(np.random.normal(0, 1, (n, 3)), columns=["x", "y", "z"])
+    data["subject_id"] = np.random.choice(["s1", "s2", "s3"], n)
+    return data
+
+
+def test_dim_reduction_cache(tmp_path, monkeypatch):
+    data = example_data()
+    explorer = Explorer(data=data.copy(), cache_dir=str(tmp_path), verbose=False)
+    explorer.dimenionality_reduction(method="PCA", features=["x", "y", "z"])
+    assert len(list(tmp_path.iterdir())) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Embeddings should be loaded from cache")
+
+    monkeypatch.setattr(explore, "dimensionality_reduction", fail)
+    cached = Explorer(data=data.copy(), cache_dir=str(tmp_path), verbose=False)
+    cached.dimenionality_reduction(method="PCA", features=["x", "y", "z"])
+    for col in ["PCA_0", "PCA_1"]:
+        assert np.allclose(cached.data[col].values, explorer.data[col].values)
+    # Cached embeddings should be loaded into memory, not left as a read-only memmap of the cache file
+    base = cached.data["PCA_0"].values
+    while base is not None:
+        assert not isinstance(base, np.memmap)
+        base = base.base
+    cached.data.loc[0, "PCA_0"] = 0.
+    assert cached.data.loc[0, "PCA_0"] == 0.
+
+
+def test_dim_reduction_cache_miss(tmp_path):
+    explorer = Explorer(data=example_data(), cache_dir=str(tmp_path), verbose=False)
+    explorer.dimenionality_reduction(method="PCA", features=["x", "y", "z"])
+    explorer.dimenionality_reduction(method="PCA", features=["x", "y"], overwrite=True)
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+@pytest.mark.parametrize("stratify_by", ["subject_id", None])
+def test_downsample(stratify_by):
+    explorer = Explorer(data=example_data(), verbose=False)
+    explorer.downsample(sample_size=300, stratify_by=stratify_by, random_state=42)
+    assert explorer.data.shape[0] == 300
+    assert explorer.data.index.is_monotonic_increasing
+    if stratify_by is not None:
+        assert (explorer.data.subject_id.value_counts() == 100).all()
+
+
+def test_downsample_many_groups():
+    data = example_data()
+    data["subject_id"] = np.arange(data.shape[0])
+    explorer = Explorer(data=data, verbose=False)
+    explorer.downsample(sample_size=10, random_state=42)
+    assert explorer.data.shape[0] == 10
+
+
+def test_downsample_too_large():
+    explorer = Explorer(data=example_data(100), verbose=False)
+    with pytest.warns(UserWarning):
+        explorer.downsample(sample_size=200)
+    assert explorer.data.shape[0] == 100
@@ -92,6 +92,15 @@ def test_access_data(example_filegroup, source, sample_size):
         assert df.shape == (30000, 7)
 
 
+def test_access_data_columns(example_filegroup):
+    fg = example_filegroup
+    df = fg.data("primary")
+    columns = [df.columns[3], df.columns[0]]
+    subset = fg.data("primary", columns=columns)
+    assert list(subset.columns) == columns
+    assert subset.equals(df[columns])
+
+
 def test_add_population(example_filegroup):
     fg, populations = create_populations(filegroup=example_filegroup)
     fg.save()
@@ -131,6 +140,16 @@ def test_load_population_df(example_filegroup, pop_name, n):
     assert df.shape == (n, 7)
 
 
+def test_load_population_df_label_downstream(example_filegroup):
+    fg, populations = create_populations(filegroup=example_filegroup)
+    df = fg.load_population_df(population="pop1", label_downstream_affiliations=True)
+    pop_idx = {p.population_name: p.index for p in populations}
+    assert (df.loc[pop_idx["pop3"], "population_label"] == "pop3").all()
+    pop2_only = np.setdiff1d(pop_idx["pop2"], pop_idx["pop3"])
+    assert (df.loc[pop2_only, "population_label"] == "pop2").all()
+    assert (df.population_label == "pop1").sum() == 24000 - 12000
+
+
 @pytest.mark.parametrize("pop_name,n", [("pop1", 24000), ("pop2", 12000), ("pop3", 6000)])
 def test_load_ctrl_population_df(example_filegroup, pop_name, n):
     fg, populations = create_populations(filegroup=example_filegroup)
@@ -1,6 +1,7 @@
 from CytoPy.data.geometry import PopulationGeometry, ThresholdGeom, PolygonGeom, create_polygon, \
-    polygon_overlap, create_convex_hull, probablistic_ellipse, inside_ellipse, inside_polygon
-from shapely.geometry import Polygon
+    polygon_overlap, create_convex_hull, probablistic_ellipse, inside_ellipse, inside_polygon, \
+    points_in_polygon, signed_area, union_polygons
+from shapely.geometry import Polygon, Point
 from sklearn.datasets import make_blobs
 from sklearn.mixture import GaussianMixture
 import numpy as np
@@ -41,6 +42,124 @@ def test_create_polygongeom():
         assert test[k] == v
 
 
+def test_polygongeom_packed_coords():
+    test = PolygonGeom(x_values=[0, 0, 5, 5, 0],
+                       y_values=[0, 5, 5, 0, 0])
+    assert test.n_points == 5
+    assert isinstance(test.coords, bytes)
+    assert test.xy.dtype == np.float64
+    assert test.xy.shape == (5, 2)
+    son = test.to_mongo()
+    assert "x_values" not in son.keys()
+    loaded = PolygonGeom._from_son(son)
+    assert loaded.x_values == [0, 0, 5, 5, 0]
+    assert loaded.y_values == [0, 5, 5, 0, 0]
+
+
+def test_polygongeom_from_xy():
+    xy = np.array([[0, 0], [0, 5], [5, 5], [5, 0], [0, 0]])
+    test = PolygonGeom(xy=xy)
+    assert np.array_equal(test.xy, xy)
+    assert test.shape.area == 25
+
+
+def test_polygongeom_set_values():
+    test = PolygonGeom()
+    test.x_values = [0, 0, 5, 5, 0]
+    assert test.x_values == [0, 0, 5, 5, 0]
+    assert test.coords is None
+    test.y_values = [0, 5, 5, 0, 0]
+    assert test.xy.shape == (5, 2)
+    assert test.shape.area == 25
+    test.y_values = [0, 10, 10, 0]
+    test.x_values = [0, 0, 5, 5]
+    assert test.n_points == 4
+    assert test.y_values == [0, 10, 10, 0]
+
+
+def test_polygongeom_legacy_lists():
+    test = PolygonGeom._from_son({"_cls": "PolygonGeom",
+                                  "x_values": [0, 0, 5, 5, 0],
+                                  "y_values": [0, 5, 5, 0, 0]})
+    assert test.coords is None
+    assert test.shape.area == 25
+    assert test.n_points == 5
+    assert test.legacy_x_values is None
+    assert "x_values" not in test.to_mongo().keys()
+
+
+def test_polygongeom_shape_cached():
+    test = PolygonGeom(x_values=[0, 0, 5, 5, 0],
+                       y_values=[0, 5, 5, 0, 0])
+    shape = test.shape
+    assert isinstance(shape, Polygon)
+    assert test.shape is shape
+    test.x_values = [0, 0, 10, 10, 0]
+    assert test.shape is not shape
+    assert test.shape.area == 50.
+
+
+def test_polygongeom_overlap():
+    test = PolygonGeom(x_values=[0, 0, 5, 5, 0],
+                       y_values=[0, 5, 5, 0, 0])
+    other = create_polygon([2.5, 2.5, 5, 5, 2.5], [0, 5, 5, 0, 0])
+    assert test.overlap(other) == 0.5
+    assert test.overlap(other, threshold=0.6) == 0.
+
+
+def test_polygongeom_prepared_queries():
+    test = PolygonGeom(x_values=[0, 0, 5, 5, 0],
+                       y_values=[0, 5, 5, 0, 0])
+    mask = test.contains_many(np.array([[1, 1], [4.5, 2], [6, 1], [-1, -1]]))
+    assert np.array_equal(mask, np.array([True, True, False, False]))
+    others = [create_polygon([2.5, 2.5, 7, 7, 2.5], [0, 5, 5, 0, 0]),
+              create_polygon([6, 6, 10, 10, 6], [0, 5, 5, 0, 0])]
+    assert np.array_equal(test.intersects_many(others), np.array([True, False]))
+
+
+def test_points_in_polygon():
+    poly = create_polygon([0, 0, 5, 5, 2.5, 0], [0, 5, 5, 0, 2.5, 0])
+    xs, ys = np.random.uniform(-1, 6, 1000), np.random.uniform(-1, 6, 1000)
+    expected = np.array([poly.contains(Point(x, y)) for x, y in zip(xs, ys)])
+    assert np.array_equal(points_in_polygon(xs, ys, poly), expected)
+
+
+def test_points_in_polygon_boundary():
+    poly = create_polygon([0, 0, 1, 1, 0], [0, 1, 1, 0, 0])
+    # Vertices, edge midpoints, one interior and one exterior point
+    xs = np.array([0, 1, 1, 0, 0.5, 0.5, 0, 1, 0.5, 2])
+    ys = np.array([0, 0, 1, 1, 0, 1, 0.5, 0.5, 0.5, 2])
+    expected = np.array([poly.contains(Point(x, y)) for x, y in zip(xs, ys)])
+    assert np.array_equal(points_in_polygon(xs, ys, poly), expected)
+    assert points_in_polygon(xs, ys, poly).tolist() == [False] * 8 + [True, False]
+
+
+def test_polygongeom_contains_agree():
+    test = PolygonGeom(x_values=[0, 0, 5, 5, 2.5, 0],
+                       y_values=[0, 5, 5, 0, 2.5, 0])
+    xs = np.concatenate([np.random.uniform(-1, 6, 1000), test.xy[:, 0], [0, 2.5, 5, 1.25]])
+    ys = np.concatenate([np.random.uniform(-1, 6, 1000), test.xy[:, 1], [2.5, 5, 2.5, 1.25]])
+    points = np.column_stack([xs, ys])
+    expected = np.array([test.shape.contains(Point(p)) for p in points])
+    assert np.array_equal(test.contains_many(points), expected)
+    assert np.array_equal(test.contains_points(xs, ys), expected)
+
+
+def test_signed_area():
+    assert signed_area(np.array([[0, 0], [5, 0], [5, 5], [0, 5]])) == 25.
+    assert signed_area(np.array([[0, 0], [0, 5], [5, 5], [5, 0]])) == -25.
+
+
+def test_union_polygons():
+    polys = [create_polygon([0, 0, 5, 5, 0], [0, 5, 5, 0, 0]),
+             create_polygon([2.5, 2.5, 7, 7, 2.5], [0, 5, 5, 0, 0]),
+             create_polygon([6, 6, 10, 10, 6], [0, 5, 5, 0, 0])]
+    union = union_polygons(np.array(polys, dtype=object))
+    assert union.geom_type == "Polygon"
+    assert union.area == 50
+    assert union_polygons(polys).area == 50
+
+
 def test_create_polygon():
     x = [2, 6, 9, 10, 2]
     y = [5, 19, 18, 10, 5]
@@ -1,5 +1,5 @@
 from CytoPy.data import population
-from CytoPy.data.geometry import ThresholdGeom, PolygonGeom
+from CytoPy.data.geometry import PopulationGeometry, ThresholdGeom, PolygonGeom
 from shapely.geometry import Polygon as Poly
 import pandas as pd
 import numpy as np
@@ -47,6 +47,18 @@ def test_cluster_init():
                            n=1000,
                            index=[0, 1, 2, 3, 4])
     assert np.array_equal(np.array([0, 1, 2, 3, 4]), x.index)
+    assert x.index.dtype == np.int32
+
+
+def test_add_cluster():
+    pop = population.Population(population_name="test")
+    pop.add_cluster(population.Cluster(cluster_id="a", tag="t", n=1, prop_of_events=0.1, index=[0]))
+    pop.add_cluster(population.Cluster(cluster_id="a", tag="u", n=1, prop_of_events=0.1, index=[0]))
+    with pytest.raises(AssertionError):
+        pop.add_cluster(population.Cluster(cluster_id="a", tag="t", n=1, prop_of_events=0.1, index=[0]))
+    pop.delete_cluster(tag="t")
+    pop.add_cluster(population.Cluster(cluster_id="a", tag="t", n=1, prop_of_events=0.1, index=[0]))
+    assert len(pop.clusters) == 2
 
 
 def test_polygon_shape():
@@ -62,6 +74,7 @@ def test_population_init():
                               parent="test_parent")
     x.index = np.array([0, 1, 2, 3, 4, 5])
     assert np.array_equal(np.array([0, 1, 2, 3, 4, 5]), x.index)
+    assert x.index.dtype == np.int32
     assert x.n == 6
     x.set_ctrl_index(x=np.array([0, 1, 2, 3, 4, 5]),
                      y=np.array([4, 5, 6, 7, 8, 9]))
@@ -123,6 +136,19 @@ def test_check_overlap():
     assert population._check_overlap(x, y, error=False) is False
 
 
+def test_check_transforms_dimensions():
+    pops = [population.Population(population_name=str(i),
+                                  geom=ThresholdGeom(x="CD3", y="CD4", transform_x="logicle", transform_y="logicle"))
+            for i in range(3)]
+    population._check_transforms_dimensions(pops[0], pops[1])
+    population._check_transforms_dimensions_many(pops)
+    pops[2].geom.transform_y = None
+    with pytest.raises(AssertionError):
+        population._check_transforms_dimensions(pops[0], pops[2])
+    with pytest.raises(AssertionError):
+        population._check_transforms_dimensions_many(pops)
+
+
 def test_merge_index():
     x = population.Population(population_name="test",
                               parent="test_parent")
@@ -132,6 +158,30 @@ def test_merge_index():
     y.index = np.array([0, 1, 3, 8, 11, 15, 19])
     idx = population._merge_index(x, y)
     assert np.array_equal(idx, np.array([0, 1, 2, 3, 4, 5, 8, 11, 13, 15, 19]))
+    y.index = np.array([19, 0, 8, 1, 15, 3, 11])
+    idx = population._merge_index(x, y)
+    assert np.array_equal(idx, np.array([0, 1, 2, 3, 4, 5, 8, 11, 13, 15, 19]))
+
+
+def test_merge_index_small_right():
+    x = population.Population(population_name="test",
+                              parent="test_parent",
+                              index=np.arange(0, 200, 2))
+    y = population.Population(population_name="test",
+                              parent="test_parent",
+                              index=np.array([-1, 3, 4, 4, 199, 250]))
+    expected = np.unique(np.concatenate([x.index, y.index]))
+    assert np.array_equal(population._merge_index(x, y), expected)
+    assert np.array_equal(population._merge_index(y, x), expected)
+    assert population._merge_index(x, y).dtype == np.int32
+
+
+def test_merge_many_index():
+    idx = population._merge_many_index([np.array([5, 0, 11, 3]),
+                                        np.array([0, 1, 3, 8]),
+                                        np.array([19, 8, 2])])
+    assert np.array_equal(idx, np.array([0, 1, 2, 3, 5, 8, 11, 19]))
+    assert idx.dtype == np.int32
 
 
 def test_merge_signatures():
@@ -143,6 +193,10 @@ def test_merge_signatures():
     assert sig.get("x") == 15.
     assert sig.get("y") == 30.
     assert sig.get("z") == 12.5
+    y.signature = dict(x=20., y=50.)
+    sig = population._merge_signatures(x, y)
+    assert sig.get("x") == 15.
+    assert sig.get("z") == 20.
 
 
 def create_threshold_pops():
@@ -177,6 +231,51 @@ def test_merge_thresholds():
     assert merged.parent == "test"
 
 
+def test_merge_clusters():
+    left, right = create_threshold_pops()
+    left.clusters = [population.Cluster(cluster_id="a", tag="t", n=3, prop_of_events=0.3,
+                                        index=np.array([0, 1, 2])),
+                     population.Cluster(cluster_id="b", tag="t", n=2, prop_of_events=0.2,
+                                        index=np.array([4, 5]))]
+    right.clusters = [population.Cluster(cluster_id="a", tag="t", n=3, prop_of_events=0.3,
+                                         index=np.array([2, 3, 8])),
+                      population.Cluster(cluster_id="c", tag="t", n=1, prop_of_events=0.1,
+                                         index=np.array([11]))]
+    merged = population._merge_thresholds(left, right, "merged")
+    clusters = {c.cluster_id: c for c in merged.clusters}
+    assert set(clusters.keys()) == {"a", "b", "c"}
+    assert np.array_equal(clusters["a"].index, np.array([0, 1, 2, 3, 8]))
+    assert clusters["a"].n == 5
+    # Proportions are relative to the merged population, for paired and unpaired clusters alike
+    for c in clusters.values():
+        assert c.prop_of_events == pytest.approx(c.n / merged.n)
+    assert np.array_equal(clusters["b"].index, np.array([4, 5]))
+    assert np.array_equal(clusters["c"].index, np.array([11]))
+    assert len(left.clusters) == 2
+    # Unpaired clusters are copies, not shared with the source populations
+    assert clusters["b"] is not left.clusters[1]
+    clusters["b"].index = np.array([4, 5, 6])
+    assert np.array_equal(left.clusters[1].index, np.array([4, 5]))
+    assert left.clusters[1].n == 2
+
+
+def test_merge_multiple_thresholds():
+    left, right = create_threshold_pops()
+    other = population.Population(population_name="other",
+                                  parent="test",
+                                  geom=ThresholdGeom(x_threshold=0.5,
+                                                     y_threshold=1.5),
+                                  index=np.array([7, 11, 12]),
+                                  definition="--",
+                                  signature=dict(x=10, y=10))
+    merged = population.merge_multiple_populations([left, right, other], "merged")
+    assert isinstance(merged.geom, ThresholdGeom)
+    assert np.array_equal(merged.index, np.array([0, 1, 2, 3, 4, 5, 7, 8, 11, 12]))
+    assert merged.n == 10
+    assert merged.definition == "++,+-,--"
+    assert merged.signature.get("x") == 10
+
+
 def create_poly_pops():
     poly1, poly2, _ = generate_polygons()
     left = population.Population(population_name="left",
@@ -205,3 +304,41 @@ def test_merge_polygons():
     assert merged.signature.get("x") == 10
     assert merged.signature.get("y") == 10
     assert merged.parent == "test"
+
+
+def test_merge_multiple_polygons():
+    left, right = create_poly_pops()
+    third = population.Population(population_name="third",
+                                  parent="test",
+                                  geom=PolygonGeom(x_values=[4, 4, 8, 8, 4],
+                                                   y_values=[0, 5, 5, 0, 0]),
+                                  index=np.array([11, 12, 13]),
+                                  signature=dict(x=40, y=40))
+    merged = population.merge_multiple_populations([left, right, third], new_population_name="merged")
+    assert merged.population_name == "merged"
+    assert isinstance(merged.geom, PolygonGeom)
+    assert merged.geom.shape.area == 40.
+    assert np.array_equal(merged.index, np.array([0, 1, 2, 3, 4, 5, 8, 11, 12, 13]))
+    assert merged.signature.get("x") == 20
+    assert merged.parent == "test"
+
+
+def test_find_overlapping_pairs():
+    poly1, poly2, poly3 = generate_polygons()
+    pops = [population.Population(population_name="test",
+                                  parent="test_parent",
+                                  geom=p) for p in [poly1, poly2, poly3]]
+    pairs, overlap = population.find_overlapping_pairs(pops)
+    assert np.array_equal(pairs, np.array([[0, 1]]))
+    assert np.array_equal(overlap, np.array([0.5]))
+    pairs, overlap = population.find_overlapping_pairs(pops, threshold=0.6)
+    assert pairs.shape == (0, 2)
+    assert overlap.shape == (0,)
+
+
+def test_merge_populations_invalid_geom():
+    left, right = create_threshold_pops()
+    left.geom = PopulationGeometry()
+    right.geom = PopulationGeometry()
+    with pytest.raises(TypeError):
+        population.merge_populations(left, right)
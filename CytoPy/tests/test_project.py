@@ -1,5 +1,7 @@
 from CytoPy.data.project import Project
 from CytoPy.tests import assets
+from CytoPy.data.subject import Biology, biology
+from mongoengine.errors import DoesNotExist
 import pytest
 import os
 
@@ -70,3 +72,32 @@ def test_get_subject(create_project):
     p.add_subject(subject_id="test_subject")
     s = p.get_subject(subject_id="test_subject")
     assert s.subject_id == "test_subject"
+
+
+def test_get_subject_reloaded(create_project):
+    p = create_project
+    p.add_subject(subject_id="test_subject")
+    p = Project.objects(project_id="test").get()
+    s = p.get_subject(subject_id="test_subject")
+    assert s.subject_id == "test_subject"
+    with pytest.raises(AssertionError) as err:
+        p.get_subject(subject_id="missing")
+    assert str(err.value) == "Invalid subject ID, valid subjects: ['test_subject']"
+
+
+def test_list_subjects_reloaded(create_project):
+    p = create_project
+    for i in range(3):
+        p.add_subject(subject_id=f"test_subject_{i}")
+    p = Project.objects(project_id="test").get()
+    assert list(p.list_subjects()) == ["test_subject_0", "test_subject_1", "test_subject_2"]
+
+
+def test_delete_clears_biology_cache():
+    p = Project(project_id="test_delete")
+    p.save()
+    p.add_subject(subject_id="test_subject", patient_biology=[Biology(test="crp", result=3.)])
+    assert biology("test_subject", "crp", "max") == 3.
+    p.delete()
+    with pytest.raises(DoesNotExist):
+        biology("test_subject", "crp", "max")
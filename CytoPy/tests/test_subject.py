@@ -0,0 +1,42 @@
+from CytoPy.data.subject import Subject, Biology, biology
+import pytest
+
+
+@pytest.fixture
+def example_subject():
+    s = Subject(subject_id="test subject",
+                patient_biology=[Biology(test="crp", result=3.),
+                                 Biology(test="crp", result=5.),
+                                 Biology(test="wbc", result=10.)])
+    s.save()
+    yield s
+    s.delete()
+
+
+@pytest.mark.parametrize("method,expected", [("max", 5.), ("min", 3.), ("median", 4.), ("average", 4.)])
+def test_biology(example_subject, method, expected):
+    assert biology("test subject", "crp", method) == expected
+
+
+def test_biology_missing_test(example_subject):
+    assert biology("test subject", "il6", "average") is None
+    assert biology(None, "crp", "average") is None
+
+
+def test_biology_cached(example_subject, monkeypatch):
+    queries = list()
+    objects = Subject.objects
+
+    def counting_objects(*args, **kwargs):
+        queries.append(kwargs)
+        return objects(*args, **kwargs)
+
+    monkeypatch.setattr(Subject, "objects", counting_objects)
+    for method in ["max", "min", "median"]:
+        biology("test subject", "crp", method)
+    assert len(queries) == 1
+    # Saving the subject invalidates the cache
+    example_subject.patient_biology.append(Biology(test="crp", result=10.))
+    example_subject.save()
+    assert biology("test subject", "crp", "max") == 10.
+    assert len(queries) == 2
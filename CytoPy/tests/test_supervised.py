@@ -0,0 +1,148 @@
+from CytoPy.flow import supervised
+from sklearn import metrics as skmetrics
+from sklearn.utils.class_weight import compute_class_weight
+from types import SimpleNamespace
+import pandas as pd
+import numpy as np
+import pytest
+
+EXPECTED_METRICS = {"f1_macro": lambda t, p: skmetrics.f1_score(t, p, average="macro"),
+                    "f1_micro": lambda t, p: skmetrics.f1_score(t, p, average="micro"),
+                    "f1_weighted": lambda t, p: skmetrics.f1_score(t, p, average="weighted"),
+                    "accuracy_score": skmetrics.accuracy_score,
+                    "balanced_accuracy_score": skmetrics.balanced_accuracy_score}
+
+
+def example_labels(n_classes: int, n: int = 500):
+    np.random.seed(42)
+    y_true = np.random.randint(0, n_classes, n)
+    y_pred = np.where(np.random.uniform(0, 1, n) < 0.7, y_true, np.random.randint(0, n_classes, n))
+    return y_true, y_pred
+
+
+@pytest.mark.parametrize("n_classes", [2, 4])
+def test_calc_metrics_confusion(n_classes):
+    y_true, y_pred = example_labels(n_classes)
+    results = supervised.calc_metrics(supervised.CONFUSION_METRICS, y_true=y_true, y_pred=y_pred)
+    for m, f in EXPECTED_METRICS.items():
+        assert results[m] == pytest.approx(f(y_true, y_pred))
+
+
+@pytest.mark.filterwarnings("ignore::UserWarning")
+def test_calc_metrics_confusion_pred_only_label():
+    y_true, y_pred = example_labels(3)
+    # Label 3 is only ever predicted, never observed
+    y_pred[:20] = 3
+    expected = {m: f(y_true, y_pred) for m, f in EXPECTED_METRICS.items()}
+    results = supervised.calc_metrics(supervised.CONFUSION_METRICS, y_true=y_true, y_pred=y_pred)
+    for m in EXPECTED_METRICS.keys():
+        assert results[m] == pytest.approx(expected[m])
+
+
+@pytest.mark.parametrize("metric", ["f1_macro", "balanced_accuracy_score"])
+def test_calc_metrics_single(metric):
+    y_true, y_pred = example_labels(3)
+    results = supervised.calc_metrics([metric], y_true=y_true, y_pred=y_pred)
+    assert list(results.keys()) == [metric]
+    assert results[metric] == pytest.approx(EXPECTED_METRICS[metric](y_true, y_pred))
+
+
+class ExampleFileGroup:
+    """
+    Minimal stand-in for a FileGroup: populations with an index and load_population_df
+    """
+    def __init__(self):
+        self.data = pd.DataFrame({"x": np.arange(10, dtype=np.float64),
+                                  "y": np.arange(10, 20, dtype=np.float64)})
+        indexes = {"root": np.arange(10),
+                   "P": np.arange(8),
+                   "A": np.array([0, 1, 2, 3]),
+                   "B": np.array([2, 3]),
+                   "C": np.array([7, 8])}
+        self.populations = [SimpleNamespace(population_name=k, index=v) for k, v in indexes.items()]
+
+    def load_population_df(self, population: str, transform: str, columns: list):
+        idx = [p.index for p in self.populations if p.population_name == population][0]
+        return self.data.loc[idx, columns]
+
+
+# Membership of the 8 events of P in A, B and C (event 8 of C falls outside of P)
+EXPECTED_MULTILABEL = np.array([[1, 0, 0], [1, 0, 0], [1, 1, 0], [1, 1, 0],
+                                [0, 0, 0], [0, 0, 0], [0, 0, 0], [0, 0, 1]], dtype=np.uint8)
+EXPECTED_SINGLELABEL = np.array([1, 1, 2, 2, 0, 0, 0, 3])
+
+
+def test_multilabel():
+    x, y = supervised.multilabel(ExampleFileGroup(), root_population="P", population_labels=["A", "B", "C"],
+                                 transform=None, features=["x", "y"])
+    assert x.shape == (8, 2)
+    assert list(y.columns) == ["A", "B", "C"]
+    assert np.array_equal(y.index.values, x.index.values)
+    assert np.array_equal(y.values, EXPECTED_MULTILABEL)
+
+
+def test_multilabel_sparse():
+    x, y = supervised.multilabel(ExampleFileGroup(), root_population="P", population_labels=["A", "B", "C"],
+                                 transform=None, features=["x", "y"], as_numpy=True, sparse=True)
+    assert isinstance(x, np.ndarray)
+    assert x.dtype == np.float32
+    assert y.format == "csr"
+    assert np.array_equal(y.toarray(), EXPECTED_MULTILABEL)
+
+
+def test_singlelabel():
+    x, y = supervised.singlelabel(ExampleFileGroup(), root_population="P", population_labels=["A", "B", "C"],
+                                  transform=None, features=["x", "y"])
+    assert x.shape == (8, 2)
+    assert np.array_equal(y, EXPECTED_SINGLELABEL)
+
+
+def test_singlelabel_categorical():
+    x, y = supervised.singlelabel(ExampleFileGroup(), root_population="P", population_labels=["A", "B", "C"],
+                                  transform=None, features=["x", "y"], categorical=True)
+    assert list(y.categories) == ["P", "A", "B", "C"]
+    assert np.array_equal(y.codes, EXPECTED_SINGLELABEL)
+
+
+def test_singlelabel_categorical_duplicates():
+    x, y = supervised.singlelabel(ExampleFileGroup(), root_population="P", population_labels=["P", "A", "B"],
+                                  transform=None, features=["x", "y"], categorical=True)
+    assert list(y.categories) == ["P", "A", "B"]
+    assert list(y) == ["A", "A", "B", "B", "P", "P", "P", "P"]
+
+
+@pytest.mark.parametrize("y,classes", [(np.array([0, 0, 0, 1, 2, 2]), None),
+                                       (np.array([0, 0, 0, 1, 2, 2]), np.arange(3)),
+                                       (np.array(["a", "a", "a", "b", "c", "c"]), np.array(["a", "b", "c"]))])
+def test_auto_weights(y, classes):
+    weights = supervised.auto_weights(y, classes=classes)
+    expected = compute_class_weight("balanced", classes=np.unique(y), y=y)
+    assert list(weights.keys()) == [0, 1, 2]
+    assert np.allclose(list(weights.values()), expected)
+
+
+@pytest.mark.parametrize("y,classes", [(np.array([0, 0, 2, 2]), np.arange(3)),
+                                       (np.array(["a", "a", "c"]), np.array(["a", "b", "c"]))])
+def test_auto_weights_absent_class(y, classes):
+    with pytest.raises(AssertionError) as err:
+        supervised.auto_weights(y, classes=classes)
+    assert str(err.value) == "Every class should be present in y"
+
+
+def test_build_sklearn_model_registered(monkeypatch):
+    monkeypatch.setattr(supervised, "_CLASS_REGISTRY", dict(supervised._CLASS_REGISTRY))
+
+    class ExampleClassifier:
+        def __init__(self, alpha=1.):
+            self.alpha = alpha
+
+    supervised.register_class(ExampleClassifier)
+    model = supervised.build_sklearn_model("ExampleClassifier", alpha=0.5)
+    assert isinstance(model, ExampleClassifier)
+    assert model.alpha == 0.5
+
+
+def test_build_sklearn_model_unknown():
+    with pytest.raises(AssertionError) as err:
+        supervised.build_sklearn_model("NotAClassifier")
+    assert "Module NotAClassifier not found" in str(err.value)
@@ -1,6 +1,7 @@
 from ..data.geometry import inside_polygon
 from shapely.geometry import Polygon
 import pandas as pd
+import pytest
 
 
 def test_inside_polygon():
@@ -12,3 +13,11 @@ def test_inside_polygon():
     df = inside_polygon(df=df, x="x", y="y", poly=poly)
     assert df.shape[0] == 4
     assert list(df.index.values) == [0, 4, 6, 7]
+
+
+def test_inside_polygon_njobs_deprecated():
+    poly = Polygon([[0., 0.], [0., 1.], [1., 1.], [1., 0.], [0., 0.]])
+    df = pd.DataFrame({"x": [0.5, 2.], "y": [0.5, 2.]})
+    with pytest.warns(DeprecationWarning):
+        df = inside_polygon(df=df, x="x", y="y", poly=poly, njobs=4)
+    assert list(df.index.values) == [0]